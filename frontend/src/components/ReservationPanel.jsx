@@ -70,39 +70,67 @@ export function ReservationPanel({
 
 // ReservationPanel function kulla...
 useEffect(() => {
-  let interval;
+  // QR display-la iruntha mattum scan-ku wait pannum. Server push (SSE) first;
+  // browser/proxy SSE support illana long-poll fallback. Server ASGI-la
+  // illana (501) pazhaya maathiri 2 seconds-ku oru vaati check pannum.
+  if (!qrImage) return;
 
-  // QR image display-la iruntha mattum check panna aarambikum
-  if (qrImage) {
-    interval = setInterval(async () => {
+  let stopped = false;
+  let source = null;
+
+  const onScanned = () => {
+    if (stopped) return;
+    stopped = true;
+    if (source) source.close();
+    console.log("Scan detected!");
+    alert("QR Scanned Successfully!");
+
+    // Ippo backend-la record delete aayiduchu, so panel-ah close panrom
+    onCancel(spotId, spotType);
+    onClose();
+  };
+
+  const pause = () => new Promise((resolve) => setTimeout(resolve, 2000));
+
+  const poll = async () => {
+    while (!stopped) {
       try {
         const response = await API.get(`check_scan_status/${spotId}/`);
-        
-        {/*if (response.data.is_scanned === true) {
-          alert("QR Scanned Successfully! Closing Panel...");
-          clearInterval(interval);
-          onClose(); // Inga thaan unga panel close aaguthu
-          
-          // Optional: State-a clear panna
-          setQrImage(null);check_scan_status
-          setStep(1);
-        }*/}
-        if (response.data.is_scanned === true) {
-          console.log("Scan detected!");
-          clearInterval(interval);
-          alert("QR Scanned Successfully!");
-          
-          // Ippo backend-la record delete aayiduchu, so panel-ah close panrom
-          onCancel(spotId, spotType); 
-          onClose(); 
-        }
+        if (response.data.is_scanned === true) return onScanned();
+      } catch (error) {
+        console.error("Scanning error:", error);
+      }
+      await pause();
+    }
+  };
+
+  const longPoll = async () => {
+    while (!stopped) {
+      try {
+        const response = await API.get(`wait_scan_status/${spotId}/`);
+        if (response.data.is_scanned === true) return onScanned();
       } catch (error) {
+        if (error.response && error.response.status === 501) return poll(); // WSGI server: no push
         console.error("Scanning error:", error);
+        await pause();
       }
-    }, 2000); // 2 seconds-ku oru vaati check pannum
+    }
+  };
+
+  if (window.EventSource) {
+    source = new EventSource(`${API.defaults.baseURL}scan_status_stream/${spotId}/`);
+    source.addEventListener("scanned", onScanned);
+    source.addEventListener("timeout", () => { source.close(); longPoll(); });
+    source.onerror = () => { source.close(); longPoll(); };
+  } else {
+    longPoll();
   }
 
-  return () => clearInterval(interval); // Component close aana stop aagidum
+  return () => {
+    // Component close aana stop aagidum
+    stopped = true;
+    if (source) source.close();
+  };
 }, [qrImage, spotId, onClose]);
 
   const handleReservationSubmit = async (e) => {
@@ -143,7 +171,8 @@ useEffect(() => {
         spot_id: spotId, email: formData.email, password: formData.password,
       });
       alert(response.data.success);
-      if (response.data.qr)  setQrImage(`http://127.0.0.1:8000/${response.data.qr}?t=${new Date().getTime()}`);
+      const qr = response.data.qr;
+      if (qr) setQrImage(qr.startsWith("data:") ? qr : `http://127.0.0.1:8000/${qr}`);
       else { onCancel(spotId, spotType); onClose(); }
     } catch (error) {
       alert(error.response?.data?.error || "Cancel failed");
@@ -0,0 +1,490 @@
+"""Throughput and latency of every route in parking/urls.py, against a seeded
+scratch database.
+
+    python benchmarks/api.py [--reservations 20000] [--monthly 2000] [--yearly 1000]
+                             [--employees 50] [--requests 200] [--concurrency 8]
+                             [--only reserve,gate-check] [--alongside check_scan_status]
+                             [--json out.json] [--compare base.json]
+
+Seeds a throwaway database (benchmarks/bench_settings.py; db.sqlite3, media/
+and the face index are never touched) with the given volumes, using the
+engine and connection settings of the current DB_PROFILE, then drives
+each route --requests times from --concurrency threads through Django's test
+client - the full middleware / URL / view stack, minus the socket. Every run
+with the same options and --seed sends the same requests.
+
+--alongside keeps other routes busy (from --concurrency threads each) for
+the whole time the selected ones are measured, and reports them too: the
+competing load a route sees in production.
+
+Reports requests/s and p50/p95/p99 latency per route. --json writes the
+numbers (plus options and git commit) for diffing between commits;
+--compare prints the change against such a file. Routes in parking/urls.py
+with no scenario here are listed as not covered.
+
+Write routes that would fill the spot layout (reserve, allocate) use fresh
+branches so they measure the success path, not 409s. The long-lived scan
+routes go through the async test client (they only serve over ASGI) with a
+short wait (BENCH_LONG_POLL_SECONDS), so they measure the set-up and the
+checks around it rather than the idle wait. Face verification
+uses whatever face stack is installed: without DeepFace that is the OpenCV
+fallback.
+"""
+import argparse
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from datetime import time as dtime
+
+from asgiref.sync import async_to_sync
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+BRANCHES = 20
+PASSWORD = "bench"
+STAFF_USER = "bench-staff"  # the list routes are staff only
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -----------------------------
+# Seeding
+# -----------------------------
+def face_jpeg(i):
+    """A synthetic, ORB-friendly 'face' that is the same for the same i on every run."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.RandomState(i)
+    img = np.full((240, 200, 3), 200, np.uint8)
+    for _ in range(40):
+        x, y = rng.randint(0, 200), rng.randint(0, 240)
+        color = tuple(int(c) for c in rng.randint(0, 255, 3))
+        cv2.circle(img, (x, y), int(rng.randint(4, 30)), color, -1)
+        cv2.rectangle(img, (x, y), (x + int(rng.randint(5, 40)), y + int(rng.randint(5, 40))), color, 2)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+class Seed:
+    """What was seeded, so scenarios can aim at rows that exist."""
+
+    def __init__(self, args):
+        self.args = args
+        self.reservations = []   # (spot_id, email)
+        self.plates = []
+        self.faces = []          # jpeg bytes of seeded employees
+
+
+def seed_database(args):
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from parking.models import Employee, MonthlyPass, Reservation, YearlyPass
+    from parking.orb_store import get_orb_store
+
+    call_command("migrate", verbosity=0)
+    call_command("flush", interactive=False, verbosity=0)  # a reused (PostgreSQL) bench database
+    get_user_model().objects.create_user(STAFF_USER, password=PASSWORD, is_staff=True)
+    rng = random.Random(args.seed)
+    seed = Seed(args)
+    spots = [(spot_type, spot_id) for spot_type, pool in settings.PARKING_LAYOUT.items() for spot_id in pool["spots"]]
+    today = timezone.localdate()
+    batch = 1000
+
+    rows = []
+    for i in range(args.reservations):
+        spot_type, spot_id = spots[i % len(spots)]
+        start = rng.randrange(6, 20)
+        hours = rng.randrange(1, 4)
+        email = f"user{i}@bench.test"
+        rows.append(Reservation(branch=f"branch-{i % BRANCHES}", spot_id=spot_id, spot_type=spot_type,
+                                name=f"User {i}", email=email, password=PASSWORD,
+                                start_time=dtime(start), end_time=dtime(min(start + hours, 23)),
+                                duration_hours=hours))
+        seed.reservations.append((spot_id, email))
+    Reservation.objects.bulk_create(rows, batch_size=batch)
+
+    # Passes go to every 10th reservation user (so cancel-reservation sees both kinds)
+    for model, count, days in ((MonthlyPass, args.monthly, 30), (YearlyPass, args.yearly, 365)):
+        rows = []
+        for i in range(count):
+            plate = f"TN{model.__name__[0]}{i:06d}"
+            rows.append(model(name=f"User {i * 10}", email=f"user{i * 10}@bench.test", age=30,
+                              vehicle_number=plate, start_time=dtime(6), end_time=dtime(22),
+                              start_date=today - timedelta(days=rng.randrange(days)),
+                              end_date=today + timedelta(days=rng.randrange(1, days))))
+            seed.plates.append(plate)
+        model.objects.bulk_create(rows, batch_size=batch)
+
+    faces_dir = os.path.join(settings.MEDIA_ROOT, "employee_faces")
+    os.makedirs(faces_dir, exist_ok=True)
+    rows = []
+    for i in range(args.employees):
+        jpeg = face_jpeg(i)
+        with open(os.path.join(faces_dir, f"bench{i}.jpg"), "wb") as f:
+            f.write(jpeg)
+        seed.faces.append(jpeg)
+        rows.append(Employee(name=f"Employee {i}", email=f"emp{i}@bench.test", phone="9876543210",
+                             employee_id=f"B-{i:05d}", age=30, vehicle_number=f"TNE{i:06d}",
+                             profile_pic=f"employee_faces/bench{i}.jpg"))
+    Employee.objects.bulk_create(rows, batch_size=batch)
+
+    # bulk_create skips the signals that keep these in step
+    get_orb_store().sync_employees()
+    try:
+        import deepface  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        call_command("build_face_index", verbosity=0)
+    call_command("rebuild_rollups", stdout=io.StringIO())
+    return seed
+
+
+# -----------------------------
+# Scenarios: route name -> request builder (untimed)
+# -----------------------------
+# A builder gets (seed, i) for the i-th request of its route and returns
+# (method, path, data, extra); data is JSON unless extra says multipart.
+def _reservation(branch, spot_id, i):
+    return {"branch": branch, "spot_id": spot_id, "spot_type": "car", "name": f"Bench {i}",
+            "email": f"new{i}@bench.test", "password": PASSWORD,
+            "start_time": "09:00", "end_time": "10:00", "duration_hours": 1}
+
+
+def _pass(kind, i):
+    return {"name": f"Bench {i}", "email": f"{kind}{i}@bench.test", "age": 30,
+            "vehicle_number": f"KA{kind[0].upper()}{i:07d}", "start_time": "06:00", "end_time": "22:00",
+            "start_date": date.today().isoformat(), "end_date": (date.today() + timedelta(days=30)).isoformat()}
+
+
+def _seeded(seed, i):
+    return seed.reservations[(i * 7919) % len(seed.reservations)] if seed.reservations else ("1", "none@bench.test")
+
+
+def _face_upload(seed, i):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    jpeg = seed.faces[i % len(seed.faces)] if seed.faces else face_jpeg(i)
+    return {"image": SimpleUploadedFile("probe.jpg", jpeg, content_type="image/jpeg")}
+
+
+def _release_hold(seed, i):
+    from parking.allocator import get_allocator
+
+    _, hold = get_allocator().allocate(f"bench-release-{i // 8}", "car")
+    return "POST", "/api/spots/release/", {"hold": hold}, {}
+
+
+def _employee(seed, i):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    data = {"name": f"New {i}", "email": f"newemp{i}@bench.test", "phone": "9876543210",
+            "employee_id": f"N-{i:05d}", "age": 30, "vehicle_number": f"TNN{i:06d}",
+            "profile_pic": SimpleUploadedFile(f"new{i}.jpg", face_jpeg(100000 + i), content_type="image/jpeg")}
+    return "POST", "/api/new-employee/", data, {"multipart": True}
+
+
+def _spot(i):
+    return str(i % 12 + 1)
+
+
+def _today():
+    from django.utils import timezone
+
+    return timezone.localdate()
+
+
+SCENARIOS = {
+    "reserve": lambda s, i: ("POST", "/api/reserve/", _reservation(f"bench-new-{i}", "1", i), {}),
+    "reserve-bulk": lambda s, i: ("POST", "/api/reserve/bulk/",
+                                  [_reservation(f"bench-bulk-{i}", str(n), i * 8 + n) for n in range(1, 9)], {}),
+    "spot-availability": lambda s, i: ("GET", "/api/spots/", {"branch": f"branch-{i % BRANCHES}"}, {}),
+    "allocate-spot": lambda s, i: ("POST", "/api/spots/allocate/", {"branch": f"bench-alloc-{i // 8}", "spot_type": "car"}, {}),
+    "release-spot": _release_hold,
+    "spot-free-windows": lambda s, i: ("GET", f"/api/spots/{_spot(i)}/free-windows/", {"branch": f"branch-{i % BRANCHES}"}, {}),
+    "utilization-report": lambda s, i: ("GET", "/api/analytics/utilization/",
+                                        {"branch": f"branch-{i % BRANCHES}", "spot_type": "car",
+                                         "from": (_today() - timedelta(days=6)).isoformat(), "to": _today().isoformat()}, {}),
+    "monthly-pass": lambda s, i: ("POST", "/api/create_monthly_pass/", _pass("monthly", i), {}),
+    "monthly-pass-bulk": lambda s, i: ("POST", "/api/create_monthly_pass/bulk/",
+                                       [_pass("monthlybulk", i * 10 + n) for n in range(10)], {}),
+    "yearly-pass": lambda s, i: ("POST", "/api/yearly-pass/", _pass("yearly", i), {}),
+    "yearly-pass-bulk": lambda s, i: ("POST", "/api/yearly-pass/bulk/",
+                                      [_pass("yearlybulk", i * 10 + n) for n in range(10)], {}),
+    # A multi-lane batch: mostly known plates, some strangers
+    "gate-check": lambda s, i: ("POST", "/api/gate/check/",
+                                {"vehicle_numbers": [s.plates[(i * 8 + n) % len(s.plates)] if s.plates and n < 6 else f"XX{i}{n}"
+                                                     for n in range(8)]}, {}),
+    "cancel-reservation": lambda s, i: ("POST", "/api/cancel-reservation/",
+                                        {"spot_id": _seeded(s, i)[0], "email": _seeded(s, i)[1], "password": PASSWORD}, {}),
+    "pass-holder-cache-stats": lambda s, i: ("GET", "/api/cancel-reservation/pass-holders/stats/", None, {}),
+    "qr-code": lambda s, i: ("GET", f"/api/qr/{_spot(i)}/", None, {}),
+    "list-reservations": lambda s, i: ("GET", "/api/reservations/", {"limit": 50}, {"staff": True}),
+    "list-monthly-passes": lambda s, i: ("GET", "/api/monthly-passes/", {"limit": 50}, {"staff": True}),
+    "list-yearly-passes": lambda s, i: ("GET", "/api/yearly-passes/", {"limit": 50}, {"staff": True}),
+    "list-employees": lambda s, i: ("GET", "/api/employees/", {"limit": 50}, {"staff": True}),
+    "create_employee": _employee,
+    "verify_face": lambda s, i: ("POST", "/api/verify-face/", _face_upload(s, i), {"multipart": True}),
+    "verify_face_async": lambda s, i: ("POST", "/api/verify-face-async/", _face_upload(s, i), {"multipart": True}),
+    "verify_face_queue_stats": lambda s, i: ("GET", "/api/verify-face-async/stats/", None, {}),
+    "mark_as_scanned": lambda s, i: ("GET", f"/api/mark_as_scanned/{_spot(i)}/", None, {}),
+    "check_scan_status": lambda s, i: ("GET", f"/api/check_scan_status/{_spot(i)}/", None, {}),
+    "scan_status_stream": lambda s, i: ("GET", f"/api/scan_status_stream/{_spot(i)}/", None, {"asgi": True}),
+    "wait_scan_status": lambda s, i: ("GET", f"/api/wait_scan_status/{_spot(i)}/", None, {"asgi": True}),
+}
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+_local = threading.local()
+
+
+def _client(staff=False):
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    # Logged-in client only where needed: a session costs every request a lookup
+    name = "staff_client" if staff else "client"
+    client = getattr(_local, name, None)
+    if client is None:
+        client = Client(raise_request_exception=False)
+        if staff:
+            client.force_login(get_user_model().objects.get(username=STAFF_USER))
+        setattr(_local, name, client)
+    return client
+
+
+async def _async_get(path, data):
+    from django.test import AsyncClient
+
+    client = getattr(_local, "async_client", None)
+    if client is None:
+        client = _local.async_client = AsyncClient(raise_request_exception=False)
+    return await client.get(path, data)
+
+
+async def _drain(chunks):
+    async for _ in chunks:
+        pass
+
+
+def send(seed, builder, i):
+    from django.db import close_old_connections
+
+    method, path, data, extra = builder(seed, i)
+    client = _client(extra.get("staff", False))
+    if extra.get("asgi"):
+        # Push routes only serve over ASGI (a WSGI request gets 501)
+        call = lambda: async_to_sync(_async_get)(path, data)  # noqa: E731
+    elif method == "GET":
+        call = lambda: client.get(path, data)  # noqa: E731
+    elif extra.get("multipart"):
+        call = lambda: client.post(path, data)  # noqa: E731
+    else:
+        body = json.dumps(data)
+        call = lambda: client.generic(method, path, body, content_type="application/json")  # noqa: E731
+
+    started = time.perf_counter()
+    try:
+        response = call()
+        if response.streaming:
+            if response.is_async:
+                async_to_sync(_drain)(response.streaming_content)
+            else:
+                b"".join(response.streaming_content)
+        status = response.status_code
+    except Exception:
+        status = 599
+    elapsed = time.perf_counter() - started
+    # The test client keeps DB connections open; a real server closes them
+    # after each request unless CONN_MAX_AGE says otherwise
+    close_old_connections()
+    return elapsed, status
+
+
+def run_scenario(seed, name, args):
+    builder = SCENARIOS[name]
+    # Warm-up requests use their own numbers, so measured requests do the same work on every run
+    warmup_base = 10 ** 6
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(lambda i: send(seed, builder, warmup_base + i), range(args.warmup)))
+        started = time.perf_counter()
+        results = list(pool.map(lambda i: send(seed, builder, i), range(args.requests)))
+        wall = time.perf_counter() - started
+    return summarize(results, wall)
+
+
+def run_alongside(seed, name, args, stop):
+    """Send `name` from --concurrency threads until `stop` is set; returns its stats."""
+    builder = SCENARIOS[name]
+    numbers = itertools.count()
+    results = []
+
+    def loop():
+        while True:
+            results.append(send(seed, builder, next(numbers)))
+            if stop.is_set():
+                return
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(loop)
+    return summarize(results, time.perf_counter() - started)
+
+
+def summarize(results, wall):
+    latencies = [seconds * 1000 for seconds, _ in results]
+    statuses = {}
+    for _, code in results:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    return {
+        "requests": len(results),
+        "throughput_rps": round(len(results) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "errors": sum(n for code, n in statuses.items() if int(code) >= 500),
+        "statuses": statuses,
+    }
+
+
+def route_names():
+    from parking.urls import urlpatterns
+
+    return [pattern.name for pattern in urlpatterns]
+
+
+def print_report(scenarios, baseline):
+    header = f"{'route':<26}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}  statuses"
+    print(header)
+    print("-" * len(header))
+    for name, result in scenarios.items():
+        statuses = " ".join(f"{code}x{n}" for code, n in sorted(result["statuses"].items()))
+        print(f"{name:<26}{result['throughput_rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+              f"{result['p99_ms']:>9}{result['errors']:>8}  {statuses}")
+        old = (baseline or {}).get(name)
+        if old:
+            deltas = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+                if old[key]:
+                    deltas.append(f"{key} {(result[key] - old[key]) / old[key] * 100:+.1f}%")
+            print(f"{'':<26}vs baseline: {', '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reservations", type=int, default=20000)
+    parser.add_argument("--monthly", type=int, default=2000)
+    parser.add_argument("--yearly", type=int, default=1000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per route.")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per route first.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="Comma-separated route names to run (default: all).")
+    parser.add_argument("--alongside", help="Comma-separated routes kept running while the others are measured.")
+    parser.add_argument("--json", metavar="PATH", help="Write the results here.")
+    parser.add_argument("--compare", metavar="PATH", help="A previous --json file to compare against.")
+    parser.add_argument("--workdir", help="Scratch directory to use (and keep) instead of a temp dir.")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="parking-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ["PARKING_BENCH_DIR"] = workdir
+    # Never the real settings: they point at db.sqlite3
+    os.environ["DJANGO_SETTINGS_MODULE"] = "bench_settings"
+    sys.path.insert(0, BENCH_DIR)
+
+    import django
+
+    try:
+        django.setup()
+        # The OpenCV fallback warns on every verification when there is no face index
+        logging.getLogger("parking.face_match").setLevel(logging.ERROR)
+
+        started = time.perf_counter()
+        seed = seed_database(args)
+        print(f"Seeded {args.reservations} reservations, {args.monthly} monthly / {args.yearly} yearly passes, "
+              f"{args.employees} employees in {time.perf_counter() - started:.1f}s ({workdir})")
+
+        routes = route_names()
+        selected = args.only.split(",") if args.only else routes
+        alongside = args.alongside.split(",") if args.alongside else []
+        unknown = [name for name in selected + alongside if name not in SCENARIOS]
+        if unknown:
+            sys.exit(f"No scenario for: {', '.join(unknown)}")
+
+        scenarios = {}
+        stop = threading.Event()
+        with ThreadPoolExecutor(max(len(alongside), 1)) as background:
+            running = {name: background.submit(run_alongside, seed, name, args, stop) for name in alongside}
+            try:
+                for name in selected:
+                    scenarios[name] = run_scenario(seed, name, args)
+            finally:
+                stop.set()
+            for name, future in running.items():
+                scenarios[name] = future.result()
+
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)["scenarios"]
+        print_report(scenarios, baseline)
+        uncovered = [name for name in routes if name not in SCENARIOS]
+        if uncovered:
+            print(f"\nRoutes with no scenario (not measured): {', '.join(uncovered)}")
+
+        if args.json:
+            result = {
+                "commit": git_commit(),
+                "python": sys.version.split()[0],
+                "django": django.get_version(),
+                "options": {key: value for key, value in vars(args).items() if key not in ("json", "compare", "workdir")},
+                "scenarios": scenarios,
+                "uncovered": uncovered,
+            }
+            with open(args.json, "w") as f:
+                json.dump(result, f, indent=2, sort_keys=True)
+                f.write("\n")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Settings for the benchmark scripts: the real settings, pointed at a
+scratch directory (PARKING_BENCH_DIR) so a run never touches db.sqlite3,
+media/ or the face index."""
+import os
+
+from parking_backend.settings import *  # noqa: F401,F403
+from parking_backend.settings import DATABASES, PARKING_BRANCHES
+
+BENCH_DIR = os.environ["PARKING_BENCH_DIR"]
+
+DEBUG = False  # no per-query logging eating memory during a run
+ALLOWED_HOSTS = ["*"]
+
+# Same engine and connection settings as the chosen DB_PROFILE, different database
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES = {"default": dict(DATABASES["default"], NAME=os.path.join(BENCH_DIR, "bench.sqlite3"))}
+else:
+    # Emptied by every run: never point this at the application's database
+    DATABASES = {"default": dict(DATABASES["default"], NAME=os.environ.get("BENCH_POSTGRES_DB", "parking_bench"))}
+
+MEDIA_ROOT = os.path.join(BENCH_DIR, "media")
+FACE_INDEX_DIR = os.path.join(BENCH_DIR, "face_index")
+FACE_PROFILE_DIR = os.path.join(BENCH_DIR, "face_profile")
+
+# Long-lived scan endpoints: measure the set-up + first check, not the idle wait
+SCAN_LONG_POLL_SECONDS = float(os.environ.get("BENCH_LONG_POLL_SECONDS", "0.05"))
+SCAN_STREAM_MAX_SECONDS = 0
+
+
+class _BenchBranches(frozenset):
+    """The configured branches plus the seeded branch-N and the fresh bench-* ones the write routes use."""
+
+    def __contains__(self, branch):
+        return frozenset.__contains__(self, branch) or branch.startswith(("branch-", "bench-"))
+
+
+PARKING_BRANCHES = _BenchBranches(PARKING_BRANCHES)
@@ -0,0 +1,81 @@
+"""Write throughput of concurrent reservation creation under each DB_PROFILE.
+
+    python benchmarks/db_profiles.py [--profiles sqlite,sqlite-wal] [--concurrency 1,4,16]
+                                     [--requests 300] [--reservations 20000] [--json out.json]
+
+Runs benchmarks/api.py once per profile and concurrency level (a fresh
+process each time, since DB_PROFILE is read at settings import), limited to
+the write routes: reserve/ (one row + allocator + interval index + rollups)
+and reserve/bulk/ (eight rows in one transaction). Scan-status polls run
+at the same time (api.py --alongside, as many threads again) as the
+readers that compete with them. Prints req/s, p95 and server errors per
+profile.
+
+The postgres profile uses the POSTGRES_* variables from settings.py, with
+BENCH_POSTGRES_DB (default "parking_bench") as the database - it is emptied
+on every run. A profile that cannot run (say psycopg is missing) is
+reported and skipped.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+WRITERS = ("reserve", "reserve-bulk")
+READERS = ("check_scan_status",)
+SCENARIOS = WRITERS + READERS
+
+
+def run(profile, concurrency, args):
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        command = [sys.executable, os.path.join(BENCH_DIR, "api.py"), "--only", ",".join(WRITERS),
+                   "--alongside", ",".join(READERS),
+                   "--concurrency", str(concurrency), "--requests", str(args.requests), "--warmup", "5",
+                   "--reservations", str(args.reservations), "--monthly", "0", "--yearly", "0",
+                   "--employees", "0", "--json", out.name]
+        proc = subprocess.run(command, env=dict(os.environ, DB_PROFILE=profile), capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None, (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        with open(out.name) as f:
+            return json.load(f), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", default="sqlite,sqlite-wal", help="Comma-separated DB_PROFILE values.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated thread counts.")
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests per route and level.")
+    parser.add_argument("--reservations", type=int, default=20000, help="Rows seeded before measuring.")
+    parser.add_argument("--json", metavar="PATH", help="Write the results here.")
+    args = parser.parse_args()
+
+    results, commit = {}, None
+    header = f"{'profile':<12}{'threads':>8}" + "".join(f"{name + ' req/s':>25}{'p95 ms':>9}{'5xx':>6}" for name in SCENARIOS)
+    print(header)
+    print("-" * len(header))
+    for profile in args.profiles.split(","):
+        for concurrency in (int(n) for n in args.concurrency.split(",")):
+            data, error = run(profile, concurrency, args)
+            if data is None:
+                print(f"{profile:<12}{concurrency:>8}  skipped: {error}")
+                results.setdefault(profile, {})[str(concurrency)] = {"error": error}
+                continue
+            line = f"{profile:<12}{concurrency:>8}"
+            for name in SCENARIOS:
+                stats = data["scenarios"][name]
+                line += f"{stats['throughput_rps']:>25}{stats['p95_ms']:>9}{stats['errors']:>6}"
+            print(line)
+            results.setdefault(profile, {})[str(concurrency)] = data["scenarios"]
+            commit = data["commit"]
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commit": commit, "options": vars(args), "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Per-response serialization cost: DRF ModelSerializer + JSONRenderer vs the
+lean serializers + FastJSONRenderer used when FAST_SERIALIZATION is on.
+
+    python benchmarks/serialization.py [--number 20000]
+
+Works on unsaved model instances, so no database is touched.
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "parking_backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from parking.models import Employee, Reservation  # noqa: E402
+from parking.renderers import FastJSONRenderer, NOT_SCANNED_BODY, orjson  # noqa: E402
+from parking.serializers import (  # noqa: E402
+    EMPLOYEE_MATCH, RESERVATION_CREATED, EmployeeSerializer, ReservationSerializer,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Renders per case.")
+    args = parser.parse_args()
+
+    employee = Employee(pk=42, name="Priya", email="priya@example.com", phone="9876543210",
+                        employee_id="E-042", age=31, vehicle_number="TN09AB1234",
+                        profile_pic="employee_faces/priya.jpg",
+                        created_at=timezone.make_aware(datetime(2024, 5, 1, 9, 30)))
+    reservation = Reservation(pk=1001, branch="main", spot_id="4", spot_type="car", name="Priya",
+                              email="priya@example.com", password="secret", start_time=time(9),
+                              end_time=time(11, 30), duration_hours=2.5,
+                              created_at=timezone.make_aware(datetime(2024, 5, 1, 8, 55, 12, 345678)))
+
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+    # The reserve/ payload must not change shape
+    assert RESERVATION_CREATED.dump(reservation) == dict(ReservationSerializer(reservation).data)
+
+    cases = [
+        ("face match",
+         lambda: drf.render({"success": True, "employee": EmployeeSerializer(employee).data}),
+         lambda: fast.render({"success": True, "employee": EMPLOYEE_MATCH.dump(employee)})),
+        ("reservation create",
+         lambda: drf.render(ReservationSerializer(reservation).data),
+         lambda: fast.render(RESERVATION_CREATED.dump(reservation))),
+        ("scan status",
+         lambda: drf.render({"is_scanned": False}),
+         lambda: NOT_SCANNED_BODY),
+    ]
+
+    print(f"JSON backend: {'orjson ' + orjson.__version__ if orjson else 'stdlib json (orjson not installed)'}")
+    print(f"{'response':<20}{'DRF us/op':>12}{'fast us/op':>12}{'speedup':>10}")
+    for name, before, after in cases:
+        slow = timeit.timeit(before, number=args.number) / args.number * 1e6
+        quick = timeit.timeit(after, number=args.number) / args.number * 1e6
+        print(f"{name:<20}{slow:>12.2f}{quick:>12.2f}{slow / quick:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
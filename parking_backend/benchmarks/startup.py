@@ -0,0 +1,98 @@
+"""Cold-start cost of a Django worker: import time and peak RSS of
+`python -X importtime manage.py check`.
+
+    python benchmarks/startup.py [--runs 5] [--top 15] [--budget-ms 800] [--json]
+
+Reports the median total import time, the slowest top-level imports, peak
+RSS, and whether any heavy face-stack module (cv2, numpy, deepface,
+tensorflow) got imported - none of them should be on a plain start.
+Exits non-zero when --budget-ms is exceeded, so CI can catch regressions.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("cv2", "numpy", "deepface", "tensorflow")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+PEAK_RSS_SNIPPET = (
+    "import runpy, sys; sys.argv = ['manage.py', 'check']; "
+    "runpy.run_path('manage.py', run_name='__main__')"
+)
+
+
+def run_once(command):
+    proc = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"{' '.join(command)} failed:\n{proc.stderr[-2000:]}")
+
+    top_level = {}
+    modules = set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules.add(name)
+        if not indent:
+            top_level[name] = int(cumulative)
+    return top_level, modules
+
+
+def peak_rss_kb():
+    import resource
+
+    # Called before any other child runs: RUSAGE_CHILDREN is then this child's peak alone
+    subprocess.run([sys.executable, "-c", PEAK_RSS_SNIPPET], cwd=BACKEND_DIR, check=True,
+                   capture_output=True)
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list.")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Fail if the median exceeds this.")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object instead of a table.")
+    args = parser.parse_args()
+
+    rss_kb = peak_rss_kb()
+    command = [sys.executable, "-X", "importtime", "manage.py", "check"]
+    totals, per_module, modules = [], {}, set()
+    for _ in range(args.runs):
+        top_level, seen = run_once(command)
+        totals.append(sum(top_level.values()) / 1000)
+        modules |= seen
+        for name, us in top_level.items():
+            per_module.setdefault(name, []).append(us / 1000)
+
+    slowest = sorted(((statistics.median(v), k) for k, v in per_module.items()), reverse=True)[:args.top]
+    result = {
+        "runs": args.runs,
+        "median_import_ms": round(statistics.median(totals), 1),
+        "min_import_ms": round(min(totals), 1),
+        "peak_rss_mb": round(rss_kb / 1024, 1),
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in modules],
+        "slowest_imports_ms": {name: round(ms, 1) for ms, name in slowest},
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import time: median {result['median_import_ms']} ms, min {result['min_import_ms']} ms "
+              f"over {args.runs} runs; peak RSS {result['peak_rss_mb']} MB")
+        print(f"heavy modules loaded: {', '.join(result['heavy_modules_loaded']) or 'none'}")
+        for name, ms in result["slowest_imports_ms"].items():
+            print(f"  {ms:>8.1f} ms  {name}")
+
+    if args.budget_ms and result["median_import_ms"] > args.budget_ms:
+        sys.exit(f"Startup import time {result['median_import_ms']} ms exceeds the {args.budget_ms} ms budget")
+
+
+if __name__ == "__main__":
+    main()
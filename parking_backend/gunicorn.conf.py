@@ -0,0 +1,17 @@
+# gunicorn.conf.py
+# Picked up by a plain `gunicorn` run from this directory.
+#
+# The app is served over ASGI by uvicorn workers: the scan notification
+# stream and long-poll (parking.async_views) only work there - under a sync
+# WSGI worker they answer 501 and the panel falls back to polling.
+# Worker count comes from WEB_CONCURRENCY (gunicorn's own default is 1).
+# No preload_app: the face workers must not be forked (FACE_PRELOAD_ON_START).
+import os
+
+wsgi_app = "parking_backend.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# SSE streams stay open for up to SCAN_STREAM_MAX_SECONDS; uvicorn workers
+# keep heartbeating while they do, this only bounds a stuck worker
+timeout = 120
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Reservation, MonthlyPass, YearlyPass # Unga models-ah import pannunga
+from .models import Reservation, ReservationArchive, MonthlyPass, YearlyPass # Unga models-ah import pannunga
 
 admin.site.register(Reservation)
+admin.site.register(ReservationArchive)
 admin.site.register(MonthlyPass)
 admin.site.register(YearlyPass)
\ No newline at end of file
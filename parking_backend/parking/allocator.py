@@ -0,0 +1,316 @@
+# allocator.py
+# Server-side spot allocation. For each branch + spot type we keep the
+# remaining capacity of every spot plus a bitmap of spots that still have a
+# free unit (car spots hold 1 vehicle, shared bike spots PARKING_LAYOUT's
+# capacity), so "first free", "nearest free", take and release are a few
+# integer bit operations under one lock.
+#
+# The pools describe the spots *now*: a unit is used by a reservation whose
+# time window contains the current moment (counted from the DB the first
+# time a branch is touched, and again whenever a pool looks full) or by a
+# short-lived hold handed out by the allocate endpoint. Pools exist only for
+# the branches in PARKING_BRANCHES; check() turns away any other branch, and
+# spots or spot types not in PARKING_LAYOUT, before anything is claimed.
+#
+# A reservation for a given window does not go by the pools: claim() counts
+# the reservations overlapping that window straight from the DB (so a spot
+# booked 09:00-10:00 can still be booked 11:00-12:00, and rows saved by other
+# server processes are seen), plus holds covering it. The count and the
+# INSERT run in one transaction holding the spot's SpotLock row (see
+# lock_spot), so a second process counts only after the first has committed.
+import heapq
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .intervals import overlap_counts
+
+# The "now" window the pools are counted for
+NOW_WINDOW = timedelta(minutes=1)
+
+
+def _now():
+    # Windows are naive local datetimes (see parking.intervals)
+    return timezone.localtime().replace(tzinfo=None)
+
+
+class SpotUnavailable(Exception):
+    pass
+
+
+class UnknownSpot(Exception):
+    pass
+
+
+def lock_spot(branch, spot_id):
+    """Hold the spot's lock row until the surrounding transaction ends; call inside transaction.atomic()."""
+    from .models import SpotLock
+
+    # An UPDATE first: it takes the row lock on PostgreSQL and SQLite's write
+    # lock straight away (a SELECT first can deadlock when SQLite upgrades it)
+    lock = SpotLock.objects.filter(branch=branch, spot_id=str(spot_id))
+    if lock.update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            SpotLock.objects.create(branch=branch, spot_id=str(spot_id))
+    except IntegrityError:
+        # Another process created the row first; wait for its lock
+        lock.update(version=F('version') + 1)
+
+
+class SpotPool:
+    def __init__(self, spot_ids, capacity):
+        self.spot_ids = list(spot_ids)
+        self.position = {spot_id: i for i, spot_id in enumerate(self.spot_ids)}
+        self.capacity = capacity
+        self.free = [capacity] * len(self.spot_ids)
+        # bit i set <=> spot_ids[i] has at least one free unit
+        self.mask = (1 << len(self.spot_ids)) - 1
+
+    def set_used(self, i, used):
+        self.free[i] = max(self.capacity - used, 0)
+        if self.free[i]:
+            self.mask |= 1 << i
+        else:
+            self.mask &= ~(1 << i)
+
+    def used(self, i):
+        return self.capacity - self.free[i]
+
+    def take(self, i):
+        if not self.free[i]:
+            return False
+        self.set_used(i, self.used(i) + 1)
+        return True
+
+    def give(self, i):
+        self.set_used(i, max(self.used(i) - 1, 0))
+
+    def first_free(self):
+        if not self.mask:
+            return None
+        return (self.mask & -self.mask).bit_length() - 1
+
+    def nearest_free(self, i):
+        if not self.mask:
+            return None
+        below = self.mask & ((1 << (i + 1)) - 1)
+        above = self.mask >> i
+        candidates = []
+        if below:
+            candidates.append(below.bit_length() - 1)
+        if above:
+            candidates.append(i + (above & -above).bit_length() - 1)
+        return min(candidates, key=lambda j: (abs(j - i), j))
+
+    def summary(self):
+        return {
+            "free_units": sum(self.free),
+            "free_spots": [self.spot_ids[i] for i in range(len(self.spot_ids)) if self.mask >> i & 1],
+        }
+
+
+class Hold:
+    def __init__(self, branch, spot_id, expires_at, until):
+        self.branch = branch
+        self.spot_id = spot_id
+        self.expires_at = expires_at  # monotonic, for expiry
+        self.until = until            # local time, for overlap with booking windows
+
+    def covers(self, start, end):
+        # A hold keeps the spot from now until it expires
+        return start < self.until and end > _now()
+
+
+class SpotAllocator:
+    def __init__(self, layout, hold_seconds, branches):
+        self.layout = layout
+        self.hold_seconds = hold_seconds
+        self.branches = branches  # pools are only made for these
+        # spot_id -> spot_type
+        self.spot_types = {
+            str(spot_id): spot_type
+            for spot_type, conf in layout.items()
+            for spot_id in conf["spots"]
+        }
+        self._lock = threading.Lock()
+        self._pools = {}        # (branch, spot_type) -> SpotPool
+        self._loaded = set()    # branches whose reservations are counted
+        self._holds = {}        # token -> Hold
+        self._hold_counts = {}  # (branch, spot_id) -> live holds
+        self._expiry = []       # heap of (expires_at, token)
+
+    # -----------------------------
+    # Internal helpers (call with the lock held)
+    # -----------------------------
+    def _pool(self, branch, spot_type):
+        if branch not in self.branches:
+            raise UnknownSpot(f"Unknown branch {branch}.")
+        if branch not in self._loaded:
+            self._load(branch)
+        return self._pools[(branch, spot_type)]
+
+    def _used_now(self, branch, spot_ids):
+        now = _now()
+        counts = overlap_counts(branch, spot_ids, now, now + NOW_WINDOW)
+        return {spot_id: counts.get(spot_id, 0) + self._hold_counts.get((branch, spot_id), 0)
+                for spot_id in spot_ids}
+
+    def _load(self, branch):
+        for spot_type, conf in self.layout.items():
+            pool = self._pools[(branch, spot_type)] = SpotPool([str(s) for s in conf["spots"]], conf["capacity"])
+            for i, used in enumerate(self._used_now(branch, pool.spot_ids).values()):
+                pool.set_used(i, used)
+        self._loaded.add(branch)
+
+    def _refresh(self, branch, pool):
+        # Re-count a whole pool: bookings start and end, and other processes (or
+        # sweep_reservations) change rows this one never sees
+        for i, used in enumerate(self._used_now(branch, pool.spot_ids).values()):
+            pool.set_used(i, used)
+
+    def _locate(self, branch, spot_id):
+        spot_id = str(spot_id)
+        spot_type = self.spot_types.get(spot_id)
+        if spot_type is None:
+            raise UnknownSpot(f"Unknown spot {spot_id}.")
+        pool = self._pool(branch, spot_type)
+        return pool, pool.position[spot_id]
+
+    def _expire_holds(self):
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, token = heapq.heappop(self._expiry)
+            hold = self._holds.get(token)
+            if hold is not None and hold.expires_at <= now:
+                self._drop_hold(token)
+                pool, i = self._locate(hold.branch, hold.spot_id)
+                pool.give(i)
+
+    @staticmethod
+    def _bump(counter, key, delta):
+        counter[key] = counter.get(key, 0) + delta
+        if not counter[key]:
+            del counter[key]
+
+    def _drop_hold(self, token):
+        hold = self._holds.pop(token)
+        self._bump(self._hold_counts, (hold.branch, hold.spot_id), -1)
+        return hold
+
+    def _recount(self, branch, spot_id, pool, i):
+        pool.set_used(i, self._used_now(branch, [spot_id])[spot_id])
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def check(self, branch, spot_id, spot_type=None):
+        """Raise UnknownSpot unless the branch is configured and the spot (of `spot_type`) is in the layout."""
+        if branch not in self.branches:
+            raise UnknownSpot(f"Unknown branch {branch}.")
+        known = self.spot_types.get(str(spot_id))
+        if known is None:
+            raise UnknownSpot(f"Unknown spot {spot_id}.")
+        if spot_type is not None and spot_type != known:
+            raise UnknownSpot(f"Spot {spot_id} is a {known} spot, not {spot_type}.")
+
+    def allocate(self, branch, spot_type, near=None):
+        """Hold the first (or nearest to `near`) free spot; returns (spot_id, hold_token)."""
+        if spot_type not in self.layout:
+            raise UnknownSpot(f"Unknown spot type {spot_type}.")
+        with self._lock:
+            self._expire_holds()
+            pool = self._pool(branch, spot_type)
+            near = str(near) if near is not None else None
+            if near in pool.position:
+                i = pool.nearest_free(pool.position[near])
+            else:
+                i = pool.first_free()
+            if i is None:
+                # Looks full from here; the DB may know better
+                self._refresh(branch, pool)
+                i = pool.first_free()
+            if i is None:
+                raise SpotUnavailable(f"No free {spot_type} spots.")
+
+            pool.take(i)
+            spot_id = pool.spot_ids[i]
+            token = uuid.uuid4().hex
+            expires_at = time.monotonic() + self.hold_seconds
+            self._holds[token] = Hold(branch, spot_id, expires_at, _now() + timedelta(seconds=self.hold_seconds))
+            self._bump(self._hold_counts, (branch, spot_id), 1)
+            heapq.heappush(self._expiry, (expires_at, token))
+            return spot_id, token
+
+    def release_hold(self, token):
+        with self._lock:
+            self._expire_holds()
+            if token not in self._holds:
+                return False
+            hold = self._drop_hold(token)
+            pool, i = self._locate(hold.branch, hold.spot_id)
+            pool.give(i)
+            return True
+
+    def claim(self, branch, spot_id, start, end, hold_token=None, also_booked=0):
+        """Check `spot_id` has a free unit for [start, end); raises SpotUnavailable if not.
+
+        A hold (`hold_token`) on this spot is the caller's own and is not counted;
+        `also_booked` counts bookings not saved yet (earlier items of a bulk request).
+        Call with the spot locked (lock_spot) in the transaction that saves the
+        reservation, and follow with confirm() after it commits.
+        """
+        spot_id = str(spot_id)
+        with self._lock:
+            self._expire_holds()
+            pool, _ = self._locate(branch, spot_id)
+            held = sum(1 for token, hold in self._holds.items()
+                       if token != hold_token and hold.branch == branch and hold.spot_id == spot_id
+                       and hold.covers(start, end))
+        booked = overlap_counts(branch, [spot_id], start, end).get(spot_id, 0)
+        if booked + held + also_booked >= pool.capacity:
+            raise SpotUnavailable(f"Spot {spot_id} is already booked between {start:%H:%M} and {end:%H:%M}.")
+
+    def confirm(self, branch, spot_id, hold_token=None):
+        """The reservation is saved: its hold (if any) is used up. The row itself is counted by recount()."""
+        with self._lock:
+            hold = self._holds.get(hold_token) if hold_token else None
+            if hold is not None and hold.branch == branch and hold.spot_id == str(spot_id):
+                self._drop_hold(hold_token)
+                pool, i = self._locate(branch, hold.spot_id)
+                pool.give(i)
+
+    def recount(self, branch, spot_id):
+        """A reservation on this spot was saved or deleted; re-count it (idempotent)."""
+        spot_id = str(spot_id)
+        with self._lock:
+            if branch not in self._loaded or spot_id not in self.spot_types:
+                return
+            pool, i = self._locate(branch, spot_id)
+            self._recount(branch, spot_id, pool, i)
+
+    def availability(self, branch):
+        with self._lock:
+            self._expire_holds()
+            return {spot_type: self._pool(branch, spot_type).summary() for spot_type in self.layout}
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = SpotAllocator(settings.PARKING_LAYOUT, settings.SPOT_HOLD_SECONDS,
+                                           settings.PARKING_BRANCHES)
+    return _allocator
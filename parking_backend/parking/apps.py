@@ -4,3 +4,22 @@ from django.apps import AppConfig
 class ParkingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parking'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+
+        if settings.DB_PROFILE == "sqlite-wal":
+            from . import db
+            db.install()
+
+        if settings.METRICS_ENABLED:
+            from . import metrics
+            metrics.install()
+
+        if settings.FACE_PRELOAD_ON_START:
+            # Face-serving workers only: import OpenCV / NumPy and start the
+            # face workers now rather than on the first kiosk request
+            from .face_match import preload
+            preload()
@@ -0,0 +1,207 @@
+# async_views.py
+# Async endpoints for the ASGI app.
+#
+# Face verification is CPU/IO heavy, so it runs on a small bounded thread
+# pool and the number of in-flight requests is capped: once the queue is full
+# we answer 503 + Retry-After straight away instead of letting kiosk bursts
+# pile up and starve the cheap endpoints.
+#
+# Scan notifications replace check_scan_status polling: the panel either
+# keeps a Server-Sent Events stream open or long-polls, and both wake up as
+# soon as mark_as_scanned publishes on parking.scan_events. They need the
+# ASGI server (gunicorn.conf.py runs uvicorn workers): under WSGI Django
+# buffers an async stream until it ends and a wait holds a sync worker, so
+# there they answer 501 straight away and the panel polls check_scan_status.
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import profiling
+from .renderers import json_response, scan_status_response
+from .scan_events import consume_scan, scan_hub
+
+
+class VerifyQueue:
+    def __init__(self, workers, capacity):
+        self.capacity = capacity
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify-face")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def try_enter(self):
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                return None
+            self.in_flight += 1
+            return self.in_flight
+
+    def submit(self, fn, *args):
+        """Run fn(*args) -> (wait, ...) on the pool; the try_enter() slot is given back when it is done.
+
+        Not when the request is: a cancelled request (client gone) leaves its
+        job running, and that job still counts against the capacity.
+        """
+        try:
+            future = self.executor.submit(fn, *args)
+        except RuntimeError:
+            self.leave(0.0)  # pool shut down
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        ok = not future.cancelled() and future.exception() is None
+        self.leave(future.result()[0] if ok else 0.0)
+
+    def leave(self, wait):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "capacity": self.capacity,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / self.completed * 1000, 1) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_verify_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = VerifyQueue(settings.FACE_VERIFY_CONCURRENCY, settings.FACE_VERIFY_MAX_IN_FLIGHT)
+    return _queue
+
+
+def _run_match(image_bytes, upload_name, queued_at):
+    from .face_match import match_face  # heavy (OpenCV / NumPy); loaded on first use
+
+    wait = time.monotonic() - queued_at
+    try:
+        # Profiled here: executor threads do not inherit the request's context
+        with profiling.profiled() as profile:
+            profiling.record("queue_wait", wait * 1000)
+            result = match_face(image_bytes, upload_name)
+        return wait, result, profile
+    finally:
+        # Executor threads outlive the request, so tidy their DB connection here
+        close_old_connections()
+
+
+async def verify_face_async(request):
+    if request.method != "POST":
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    uploaded_file = request.FILES.get('image')
+    if not uploaded_file:
+        return JsonResponse({'error': 'No image provided'}, status=400)
+
+    verify_queue = get_verify_queue()
+    depth = verify_queue.try_enter()
+    if depth is None:
+        response = JsonResponse({'error': 'Face verification is busy. Please retry shortly.'}, status=503)
+        response['Retry-After'] = str(settings.FACE_VERIFY_RETRY_AFTER)
+        response['X-Face-Queue-Depth'] = str(verify_queue.capacity)
+        return response
+
+    future = verify_queue.submit(_run_match, uploaded_file.read(), uploaded_file.name, time.monotonic())
+    wait, (body, status_code), profile = await asyncio.wrap_future(future)
+
+    response = json_response(body, status_code) if settings.FAST_SERIALIZATION else JsonResponse(body, status=status_code)
+    response['X-Face-Queue-Depth'] = str(depth)
+    response['X-Face-Queue-Wait-Ms'] = f"{wait * 1000:.1f}"
+    if profile is not None and profiling.wants_server_timing(request):
+        response['Server-Timing'] = profile.server_timing()
+    return response
+
+# DRF does not do async views; plain Django needs the CSRF opt-out spelled out
+verify_face_async.csrf_exempt = True
+
+
+async def verify_face_queue_stats(request):
+    return JsonResponse(get_verify_queue().stats())
+
+
+# -----------------------------
+# SCAN NOTIFICATIONS (push replacement for check_scan_status polling)
+# -----------------------------
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _scan_stream(spot_id):
+    deadline = time.monotonic() + settings.SCAN_STREAM_MAX_SECONDS
+    with scan_hub.subscribe(spot_id) as subscription:
+        # Subscribe first, then check, so a scan between the two is not lost
+        while True:
+            if await sync_to_async(consume_scan)(spot_id):
+                yield _sse("scanned", {"is_scanned": True})
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield _sse("timeout", {"is_scanned": False})
+                return
+
+            if not await subscription.wait(min(settings.SCAN_STREAM_HEARTBEAT_SECONDS, remaining)):
+                yield ": keep-alive\n\n"
+
+
+def _push_unavailable(request):
+    if isinstance(request, ASGIRequest):
+        return None
+    return JsonResponse({"error": "Scan notifications need the ASGI server; poll check_scan_status/ instead."},
+                        status=501)
+
+
+async def scan_status_stream(request, spot_id):
+    unavailable = _push_unavailable(request)
+    if unavailable is not None:
+        return unavailable
+    response = StreamingHttpResponse(_scan_stream(spot_id), content_type="text/event-stream")
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _scan_status(is_scanned):
+    if settings.FAST_SERIALIZATION:
+        return scan_status_response(is_scanned)
+    return JsonResponse({"is_scanned": is_scanned})
+
+
+async def wait_scan_status(request, spot_id):
+    unavailable = _push_unavailable(request)
+    if unavailable is not None:
+        return unavailable
+    with scan_hub.subscribe(spot_id) as subscription:
+        if not await sync_to_async(consume_scan)(spot_id):
+            await subscription.wait(settings.SCAN_LONG_POLL_SECONDS)
+            if not await sync_to_async(consume_scan)(spot_id):
+                return _scan_status(False)
+    return _scan_status(True)
@@ -0,0 +1,133 @@
+# bulk.py
+# Batch versions of reserve/ and the pass endpoints for fleet and corporate
+# onboarding. The whole list is validated with one many=True serializer, the
+# good items go in with a single bulk_create inside one transaction (one
+# fsync on SQLite instead of one per vehicle), and the response carries a
+# result per item in request order.
+#
+# bulk_create does not send post_save, so both paths do the bookkeeping
+# parking.signals does for single saves (allocator, interval index and
+# occupancy rollups for reservations; the gate entitlement index and the
+# pass-holder cache for passes).
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .allocator import SpotUnavailable, UnknownSpot, get_allocator, lock_spot
+from .entitlements import get_entitlement_index
+from .intervals import get_interval_index, reservation_window
+from .pass_holders import get_pass_holder_cache
+from .rollups import record_created
+
+
+def _validate(serializer_class, items):
+    """Return ({index: validated_data}, {index: errors}) for a list of items."""
+    serializer = serializer_class(data=items, many=True)
+    if serializer.is_valid():
+        return dict(enumerate(serializer.validated_data)), {}
+
+    errors = {i: item_errors for i, item_errors in enumerate(serializer.errors) if item_errors}
+    good = [i for i in range(len(items)) if i not in errors]
+    # Only the good items are left, so this second pass always validates
+    retry = serializer_class(data=[items[i] for i in good], many=True)
+    retry.is_valid(raise_exception=True)
+    return dict(zip(good, retry.validated_data)), errors
+
+
+def _check_items(items):
+    if not isinstance(items, list):
+        return {"error": "Expected a list of items."}
+    if not items:
+        return {"error": "No items provided."}
+    if len(items) > settings.BULK_MAX_ITEMS:
+        return {"error": f"At most {settings.BULK_MAX_ITEMS} items per request."}
+    return None
+
+
+def _respond(serializer_class, count, created, errors):
+    results = []
+    for i in range(count):
+        if i in created:
+            results.append({"index": i, "ok": True, "data": serializer_class(created[i]).data})
+        else:
+            results.append({"index": i, "ok": False, "errors": errors[i]})
+
+    body = {"created": len(created), "failed": len(errors), "results": results}
+    if not errors:
+        return body, status.HTTP_201_CREATED
+    if not created:
+        return body, status.HTTP_400_BAD_REQUEST
+    return body, status.HTTP_207_MULTI_STATUS
+
+
+def bulk_create_passes(serializer_class, items, pass_type):
+    """Create monthly / yearly passes in one transaction; returns (body, status)."""
+    problem = _check_items(items)
+    if problem:
+        return problem, status.HTTP_400_BAD_REQUEST
+
+    valid, errors = _validate(serializer_class, items)
+    model = serializer_class.Meta.model
+    objs = {i: model(**data) for i, data in valid.items()}
+    with transaction.atomic():
+        model.objects.bulk_create(objs.values())
+
+    entitlements = get_entitlement_index()
+    for obj in objs.values():
+        entitlements.upsert(pass_type, obj)
+    if objs:
+        get_pass_holder_cache().invalidate()
+    return _respond(serializer_class, len(items), objs, errors)
+
+
+def bulk_create_reservations(serializer_class, items):
+    """Create reservations in one transaction, checking each spot's window first; returns (body, status)."""
+    problem = _check_items(items)
+    if problem:
+        return problem, status.HTTP_400_BAD_REQUEST
+
+    valid, errors = _validate(serializer_class, items)
+    allocator = get_allocator()
+    today = timezone.localdate()
+    for i, data in list(valid.items()):
+        try:
+            allocator.check(data.get('branch', ''), data['spot_id'], data['spot_type'])
+        except UnknownSpot as e:
+            errors[i] = {"error": str(e)}
+            del valid[i]
+
+    objs = {}
+    windows = []  # (branch, spot_id, start, end) of the items accepted so far
+    with transaction.atomic():
+        # Every spot in the batch stays locked till commit (in a fixed order, so two
+        # batches cannot deadlock): no other process can count or insert in between
+        spots = {(data.get('branch', ''), str(data['spot_id'])) for data in valid.values()}
+        for branch, spot_id in sorted(spots):
+            lock_spot(branch, spot_id)
+
+        for i, data in valid.items():
+            branch = data.get('branch', '')
+            spot_id = str(data['spot_id'])
+            start, end = reservation_window(today, data['start_time'], data['end_time'])
+            # Earlier items of this batch are not in the DB yet
+            also_booked = sum(1 for b, s, w_start, w_end in windows
+                              if (b, s) == (branch, spot_id) and w_start < end and w_end > start)
+            try:
+                allocator.claim(branch, spot_id, start, end, also_booked=also_booked)
+            except (UnknownSpot, SpotUnavailable) as e:
+                errors[i] = {"error": str(e)}
+                continue
+
+            windows.append((branch, spot_id, start, end))
+            objs[i] = serializer_class.Meta.model(**data)
+
+        serializer_class.Meta.model.objects.bulk_create(objs.values())
+        record_created(*objs.values())
+
+    interval_index = get_interval_index()
+    for obj in objs.values():
+        interval_index.track(obj)
+    for branch, spot_id in {(b, s) for b, s, _, _ in windows}:
+        allocator.recount(branch, spot_id)
+    return _respond(serializer_class, len(items), objs, errors)
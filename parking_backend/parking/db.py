@@ -0,0 +1,26 @@
+# db.py
+# Per-connection set-up for the sqlite-wal DB_PROFILE.
+#
+# SQLite keeps most tuning per connection, and Django 4.2 has no hook for
+# it in DATABASES, so SQLITE_PRAGMAS are applied as each connection is
+# created. With CONN_MAX_AGE that is once per worker thread, not per request.
+#
+# In WAL mode readers (scan polls, lists, analytics) no longer wait for a
+# writer and the writer no longer waits for readers; writes still go one at
+# a time, and busy_timeout makes a second writer wait its turn instead of
+# failing with "database is locked".
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def install():
+    # Called from AppConfig.ready, before any connection is opened
+    connection_created.connect(apply_sqlite_pragmas, dispatch_uid="parking_sqlite_pragmas")
@@ -0,0 +1,136 @@
+# entitlements.py
+# Gate checks: "may this vehicle come in right now, and on which pass?".
+# Both pass tables are folded into one in-memory dict keyed by the
+# normalized vehicle number, so a check is a dict lookup plus a date/time
+# comparison on that vehicle's (one or two) passes, however many passes are
+# stored.
+#
+# parking.signals keeps the index current for saves and deletes in this
+# process; a full rebuild every ENTITLEMENT_RECONCILE_SECONDS picks up
+# changes made by other server processes (and anything written with
+# queryset.update()).
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+PASS_FIELDS = ('pk', 'vehicle_number', 'start_date', 'end_date', 'start_time', 'end_time')
+
+
+def normalize_plate(vehicle_number):
+    # "tn 09-ab 1234" and "TN09AB1234" are the same vehicle
+    return re.sub(r'[^0-9A-Z]', '', (vehicle_number or "").upper())
+
+
+class Entitlement:
+    def __init__(self, pass_type, pk, start_date, end_date, start_time, end_time):
+        self.pass_type = pass_type
+        self.pk = pk
+        self.start_date = start_date
+        self.end_date = end_date
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def allows(self, moment):
+        day, now = moment.date(), moment.time()
+        if self.end_time <= self.start_time:
+            # Overnight window: after midnight it still belongs to the previous day's slot
+            if now < self.end_time:
+                day -= timedelta(days=1)
+            elif now < self.start_time:
+                return False
+        elif not self.start_time <= now < self.end_time:
+            return False
+        return self.start_date <= day <= self.end_date
+
+
+class EntitlementIndex:
+    def __init__(self, reconcile_seconds):
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        self._plates = {}    # plate -> [Entitlement]
+        self._passes = {}    # (pass_type, pk) -> plate
+        self._built_at = None
+
+    def _pass_models(self):
+        from .models import MonthlyPass, YearlyPass
+
+        return (("yearly", YearlyPass), ("monthly", MonthlyPass))
+
+    def _add(self, plates, passes, pass_type, row):
+        plate = normalize_plate(row['vehicle_number'])
+        entitlement = Entitlement(pass_type, row['pk'], row['start_date'], row['end_date'],
+                                  row['start_time'], row['end_time'])
+        plates.setdefault(plate, []).append(entitlement)
+        passes[(pass_type, row['pk'])] = plate
+
+    def _drop(self, pass_type, pk):
+        plate = self._passes.pop((pass_type, pk), None)
+        if plate is None:
+            return
+        remaining = [e for e in self._plates.get(plate, ()) if (e.pass_type, e.pk) != (pass_type, pk)]
+        if remaining:
+            self._plates[plate] = remaining
+        else:
+            self._plates.pop(plate, None)
+
+    def rebuild(self):
+        """Reload every pass that has not ended yet (built off-lock, then swapped in)."""
+        # Keep yesterday too, for overnight windows that run past midnight
+        since = timezone.localdate() - timedelta(days=1)
+        plates, passes = {}, {}
+        for pass_type, model in self._pass_models():
+            for row in model.objects.filter(end_date__gte=since).values(*PASS_FIELDS):
+                self._add(plates, passes, pass_type, row)
+        with self._lock:
+            self._plates, self._passes = plates, passes
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at >= self.reconcile_seconds:
+            self.rebuild()
+
+    def upsert(self, pass_type, instance):
+        if self._built_at is None:
+            return  # not loaded yet; the first check reads it from the DB
+        row = {field: getattr(instance, field) for field in PASS_FIELDS}
+        with self._lock:
+            self._drop(pass_type, instance.pk)
+            self._add(self._plates, self._passes, pass_type, row)
+
+    def remove(self, pass_type, pk):
+        with self._lock:
+            self._drop(pass_type, pk)
+
+    def check(self, vehicle_numbers, moment=None):
+        """Return one {vehicle_number, allowed, pass_type, valid_until} dict per plate."""
+        self._ensure_fresh()
+        moment = moment or timezone.localtime().replace(tzinfo=None)
+        plates = self._plates  # one consistent snapshot for the whole batch
+        results = []
+        for vehicle_number in vehicle_numbers:
+            match = next((e for e in plates.get(normalize_plate(vehicle_number), ()) if e.allows(moment)), None)
+            results.append({
+                "vehicle_number": vehicle_number,
+                "allowed": match is not None,
+                "pass_type": match.pass_type if match else None,
+                "valid_until": match.end_date.isoformat() if match else None,
+            })
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_entitlement_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = EntitlementIndex(settings.ENTITLEMENT_RECONCILE_SECONDS)
+    return _index
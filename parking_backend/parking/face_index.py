@@ -0,0 +1,288 @@
+# face_index.py
+# Precomputed face-embedding index: one L2-normalised float32 row per
+# Employee, stored as a contiguous .npy matrix next to an array of Employee
+# primary keys. Searches memory-map the matrix and do a single matrix-vector
+# product + argmax, so a match costs one BLAS call instead of a walk over
+# media/employee_faces.
+#
+# Each write produces a new "generation" directory and then atomically swaps
+# the CURRENT pointer, so readers (in any Django process) always see a
+# matching embeddings/ids pair.
+#
+# Writes run on one background thread (in_background), never on a request:
+# embedding a photo can wait on a face worker's start-up. parking.signals
+# queues an employee's refresh there once its save commits. Employees
+# missing from the index (a fresh install or an upgrade, before anyone ran
+# build_face_index) are added by start_backfill(): verify-face starts it
+# when it finds the index empty, and FACE_PRELOAD_ON_START workers at
+# start-up.
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FaceIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        self.current_path = os.path.join(directory, "CURRENT")
+        self._lock = threading.Lock()
+        self._generation = None
+        # (matrix, ids) of one generation, published together: readers take the pair in one go
+        self._state = (None, np.empty(0, dtype=np.int64))
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def _current_generation(self):
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        generation = self._current_generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            if generation is None:
+                matrix, ids = None, np.empty(0, dtype=np.int64)
+            else:
+                gen_dir = os.path.join(self.directory, generation)
+                ids = np.load(os.path.join(gen_dir, "ids.npy"))
+                matrix = np.load(os.path.join(gen_dir, "embeddings.npy"), mmap_mode="r")
+            self._state = (matrix, ids)
+            self._generation = generation
+
+    def __len__(self):
+        self._refresh()
+        return len(self._state[1])
+
+    def ids(self):
+        self._refresh()
+        return self._state[1]
+
+    def search(self, embedding, threshold):
+        """Return (employee_pk, similarity) for the best match, or (None, best_similarity)."""
+        self._refresh()
+        matrix, ids = self._state
+        if matrix is None or not len(ids):
+            return None, 0.0
+
+        probe = _normalise(embedding)
+        if probe.shape[-1] != matrix.shape[1]:
+            logger.error(f"Face embedding size {probe.shape[-1]} does not match index size {matrix.shape[1]}")
+            return None, 0.0
+
+        scores = matrix @ probe
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        if score < threshold:
+            return None, score
+        return int(ids[best]), score
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def _snapshot(self):
+        self._refresh()
+        matrix, ids = self._state
+        if matrix is None:
+            return {}
+        return {int(pk): np.array(row) for pk, row in zip(ids, matrix)}
+
+    def _write(self, rows):
+        generation = uuid.uuid4().hex
+        gen_dir = os.path.join(self.directory, generation)
+        os.makedirs(gen_dir)
+
+        ids = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+        if rows:
+            matrix = np.ascontiguousarray(_normalise(np.stack(list(rows.values()))))
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        np.save(os.path.join(gen_dir, "embeddings.npy"), matrix)
+        np.save(os.path.join(gen_dir, "ids.npy"), ids)
+
+        tmp_path = f"{self.current_path}.{generation}"
+        with open(tmp_path, "w") as f:
+            f.write(generation)
+        os.replace(tmp_path, self.current_path)
+
+        # Keep the generation we just replaced for readers that are mid-load.
+        previous = self._generation
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and name not in (generation, previous):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _locked_update(self, change):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                rows = self._snapshot()
+                change(rows)
+                self._write(rows)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def upsert(self, pk, embedding):
+        def change(rows):
+            rows[int(pk)] = np.asarray(embedding, dtype=np.float32)
+        self._locked_update(change)
+
+    def remove(self, pk):
+        def change(rows):
+            rows.pop(int(pk), None)
+        self._locked_update(change)
+
+    def fill(self, items):
+        """Add (employee_pk, embedding) pairs for employees not in the index yet; rows already there stay."""
+        def change(rows):
+            for pk, embedding in items:
+                rows.setdefault(int(pk), np.asarray(embedding, dtype=np.float32))
+        self._locked_update(change)
+
+    def rebuild(self, items):
+        """Replace the whole index with an iterable of (employee_pk, embedding)."""
+        def change(rows):
+            rows.clear()
+            rows.update((int(pk), np.asarray(embedding, dtype=np.float32)) for pk, embedding in items)
+        self._locked_update(change)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_face_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FaceIndex(settings.FACE_INDEX_DIR)
+    return _index
+
+
+def embed_image(img_path):
+    """Run the image through a warm face worker; returns the embedding or None."""
+    from .face_pool import get_face_pool
+
+    result = get_face_pool().run({"op": "embed", "img_path": img_path})
+    if result.status == "ok" and result.data.get("success"):
+        return result.data["embedding"]
+    logger.error(f"Could not embed {img_path}: {result.error or result.data.get('error')}")
+    return None
+
+
+def index_employee(employee):
+    if not employee.profile_pic:
+        return False
+    embedding = embed_image(employee.profile_pic.path)
+    if embedding is None:
+        return False
+    get_face_index().upsert(employee.pk, embedding)
+    return True
+
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+# One thread: index writes rewrite the whole matrix (no point running two),
+# and jobs for the same employee apply in the order they were queued
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="face-index")
+
+
+def _guarded(fn, args):
+    from django.db import connection
+
+    try:
+        fn(*args)
+    except Exception as e:
+        logger.error(f"Face index job {fn.__name__} failed: {str(e)}")
+    finally:
+        connection.close()
+
+
+def in_background(fn, *args):
+    """Run fn(*args) on the face-index thread, after the jobs queued before it."""
+    return _background.submit(_guarded, fn, args)
+
+
+_backfill_lock = threading.Lock()
+_backfill_running = False
+_backfill_started_at = None
+
+
+def backfill():
+    """Embed and index every employee with a photo that the index lacks; returns how many were added."""
+    from .models import Employee
+
+    index = get_face_index()
+    os.makedirs(index.directory, exist_ok=True)
+    with open(os.path.join(index.directory, ".backfill"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0  # another process is already on it
+        try:
+            indexed = set(index.ids().tolist())
+            items = []
+            for employee in Employee.objects.exclude(profile_pic="").exclude(profile_pic__isnull=True):
+                if employee.pk in indexed:
+                    continue
+                embedding = embed_image(employee.profile_pic.path)
+                if embedding is not None:
+                    items.append((employee.pk, embedding))
+            if items:
+                index.fill(items)
+            return len(items)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _run_backfill():
+    global _backfill_running
+    try:
+        logger.info(f"Face index backfill added {backfill()} employees.")
+    finally:
+        with _backfill_lock:
+            _backfill_running = False
+
+
+def start_backfill():
+    """Queue backfill() unless one is running or one started within FACE_INDEX_BACKFILL_RETRY_SECONDS."""
+    global _backfill_running, _backfill_started_at
+    with _backfill_lock:
+        now = time.monotonic()
+        if _backfill_running or (_backfill_started_at is not None
+                                 and now - _backfill_started_at < settings.FACE_INDEX_BACKFILL_RETRY_SECONDS):
+            return False
+        _backfill_running, _backfill_started_at = True, now
+    in_background(_run_backfill)
+    return True
+
+
+def backfill_running():
+    with _backfill_lock:
+        return _backfill_running
@@ -0,0 +1,182 @@
+# face_match.py
+# The face verification pipeline shared by the sync (DRF) and async
+# verify-face views: embedding-index match in a warm worker, then the ORB
+# fallback.
+#
+# This is the only path from the request handlers to OpenCV / NumPy, and the
+# views import it on first use, so workers that never verify a face do not
+# load them. Face-serving workers can set FACE_PRELOAD_ON_START to pay that
+# cost (plus the worker spawn) at start-up instead; see preload().
+import os
+# CRITICAL: This must be set before any other imports to prevent segmentation faults with NumPy 2.x
+os.environ["NUMPY_RELAX_UPPER_BOUND"] = "1"
+
+import logging
+import uuid
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from . import metrics, profiling
+from .face_index import backfill_running, get_face_index, start_backfill
+from .face_pool import get_face_pool
+from .models import Employee
+from .orb_store import compute_descriptors, get_orb_store
+from .serializers import employee_match_data
+
+# Set up logging to track crashes
+logger = logging.getLogger(__name__)
+
+
+def _record_worker_timings(timings):
+    # Stages measured inside the face worker process (see face_worker.serve)
+    for name in ('decode', 'detect', 'embed', 'find'):
+        if name in timings:
+            profiling.record(f"worker_{name}", timings[name], timings.get('image') if name == 'decode' else None)
+
+
+def match_face(image_bytes, upload_name):
+    """Run the face verification pipeline on raw image bytes; returns (response body, HTTP status)."""
+    temp_path = None
+    try:
+        # 1. Keep the upload in memory; it is streamed to the face worker over its pipe.
+        #    FACE_DEBUG_SAVE_UPLOADS writes a uniquely named copy to media/temp instead.
+        face_job = {"op": "embed"}
+        face_payload = image_bytes
+        if settings.FACE_DEBUG_SAVE_UPLOADS:
+            temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
+            os.makedirs(temp_dir, exist_ok=True)
+            temp_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}_{os.path.basename(upload_name)}")
+            with profiling.stage("upload_write"), open(temp_path, 'wb') as destination:
+                destination.write(image_bytes)
+            face_job = {"op": "embed", "img_path": temp_path}
+            face_payload = None
+
+        # 2. Ensure DB path exists
+        db_path = os.path.join(settings.MEDIA_ROOT, 'employee_faces')
+        if not os.path.exists(db_path):
+             return {'error': 'No registered faces found in database.'}, 404
+
+        # 3. Embed the probe in a warm face worker (isolated processes prevent server crash)
+        #    and match it against the precomputed employee embedding index
+        index_state = None
+        try:
+            with profiling.stage("index_load"):
+                face_index = get_face_index()
+                indexed = len(face_index)
+            if not indexed:
+                # Upgrade / fresh install: build it in the background, and say so in the answer
+                start_backfill()
+                index_state = "building" if backfill_running() else "empty"
+                metrics.inc("parking_face_index_empty_total")
+                logger.warning(f"Face index is {index_state}; falling back to OpenCV.")
+            else:
+                result = get_face_pool().run(face_job, face_payload)
+
+                if result.status == "ok":
+                    data = result.data
+                    _record_worker_timings(data.get('timings') or {})
+                    if data.get('success'):
+                        with profiling.stage("index_search", f"{indexed} faces"):
+                            employee_pk, score = face_index.search(data['embedding'], settings.FACE_MATCH_MIN_SIMILARITY)
+                        with profiling.stage("employee_lookup"):
+                            employee = Employee.objects.filter(pk=employee_pk).first() if employee_pk else None
+                        if employee:
+                            metrics.inc("parking_face_verifications_total", (("outcome", "deepface_match"),))
+                            return {
+                                'success': True,
+                                'employee': employee_match_data(employee)
+                            }, 200
+                elif result.crashed:
+                    metrics.inc("parking_face_worker_failures_total", (("reason", "crash"),))
+                    logger.error("Face verification process crashed (Segmentation Fault). Falling back to OpenCV.")
+                elif result.status == "timeout":
+                    metrics.inc("parking_face_worker_failures_total", (("reason", "timeout"),))
+                    logger.error(f"Face verification process timed out: {result.error}")
+                else:
+                    metrics.inc("parking_face_worker_failures_total", (("reason", "error"),))
+                    logger.error(f"Face verification process failed: {result.error}")
+
+        except Exception as e:
+            logger.error(f"Face verification error: {str(e)}")
+
+        # 4. Fallback to OpenCV (Feature Matching) if DeepFace fails or crashes
+        logger.info("Starting OpenCV fallback matching...")
+        metrics.inc("parking_face_verifications_total", (("outcome", "fallback_used"),))
+        try:
+            best_match = None
+            max_matches = 0
+            
+            # Load probe image; employee-side descriptors come precomputed from the ORB store
+            with profiling.stage("orb_decode"):
+                probe_img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if probe_img is not None:
+                with profiling.stage("orb_descriptors", f"{probe_img.shape[1]}x{probe_img.shape[0]}"):
+                    des1 = compute_descriptors(probe_img)
+
+                if des1 is not None:
+                    with profiling.stage("orb_store_load"):
+                        orb_store = get_orb_store()
+                        if not orb_store.exists():
+                            orb_store.sync_employees()
+                        entries = orb_store.entries()
+
+                    with profiling.stage("orb_match", f"{len(entries)} faces"):
+                        bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+                        for employee_pk, des2 in entries:
+                            matches = bf.match(des1, des2)
+                            if len(matches) > max_matches:
+                                max_matches = len(matches)
+                                best_match = employee_pk
+
+            # Threshold for "match" in ORB - 80 is a conservative estimate
+            if max_matches > 80:
+                with profiling.stage("employee_lookup"):
+                    employee = Employee.objects.filter(pk=best_match).first()
+                if employee:
+                    metrics.inc("parking_face_verifications_total", (("outcome", "fallback_match"),))
+                    body = {
+                        'success': True,
+                        'employee': employee_match_data(employee),
+                        'method': 'fallback'
+                    }
+                    if index_state:
+                        body['face_index'] = index_state
+                    return body, 200
+
+        except Exception as e:
+            logger.error(f"OpenCV fallback error: {str(e)}")
+
+        metrics.inc("parking_face_verifications_total", (("outcome", "no_match"),))
+        if index_state:
+            return {'error': 'Face not recognized', 'face_index': index_state}, 401
+        return {'error': 'Face not recognized'}, 401
+
+    except Exception as e:
+        metrics.inc("parking_face_verifications_total", (("outcome", "error"),))
+        logger.error(f"Verify Face outer error: {str(e)}")
+        return {'error': str(e)}, 500
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except: pass
+
+
+def preload():
+    """Load the face stack now: index + ORB store in this process, face workers and any index backfill in the background."""
+    import threading
+
+    get_face_index()
+    threading.Thread(target=_warm, name="face-preload", daemon=True).start()
+
+
+def _warm():
+    try:
+        get_orb_store().entries()
+    except Exception as e:
+        logger.error(f"Could not preload the ORB store: {str(e)}")
+    get_face_pool().warm()
+    if not len(get_face_index()):
+        start_backfill()
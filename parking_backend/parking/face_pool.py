@@ -0,0 +1,250 @@
+# face_pool.py
+# Pool of long-lived face_worker.py processes. Each worker imports DeepFace
+# and loads the model once, then takes jobs over its stdin/stdout pipe, so a
+# gate check no longer pays the TensorFlow cold start. Workers still run in
+# their own process: a segfault or a hung job only costs that worker, which
+# gets killed and respawned on the next job. A worker that fails to start
+# (broken FACE_WORKER_PYTHON, missing model) is not retried on every job:
+# spawns back off exponentially, from FACE_WORKER_RESPAWN_BACKOFF seconds
+# up to FACE_WORKER_RESPAWN_BACKOFF_MAX, and jobs fail fast meanwhile.
+import atexit
+import json
+import logging
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'face_worker.py')
+SEGFAULT_CODES = (-11, 139)
+
+
+class FaceResult:
+    def __init__(self, status, data=None, error=None, returncode=None):
+        # status: "ok", "crashed", "timeout" or "error"
+        self.status = status
+        self.data = data or {}
+        self.error = error
+        self.returncode = returncode
+
+    @property
+    def crashed(self):
+        return self.status == "crashed"
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class FaceWorker:
+    def __init__(self, python_exe, script=WORKER_SCRIPT):
+        self.proc = subprocess.Popen(
+            [python_exe, script, "--serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._buffer = b""
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def wait_ready(self, timeout):
+        reply = self.read_message(time.monotonic() + timeout)
+        if not reply.get("ready"):
+            raise WorkerDied(reply.get("error", "Worker failed to start"))
+        return reply
+
+    def send(self, message, payload=None):
+        if payload is not None:
+            message = dict(message, image_size=len(payload))
+        try:
+            self.proc.stdin.write((json.dumps(message) + "\n").encode())
+            if payload is not None:
+                self.proc.stdin.write(payload)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise WorkerDied("Worker pipe closed")
+
+    def read_message(self, deadline):
+        fd = self.proc.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError()
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise WorkerDied("Worker exited")
+            self._buffer += chunk
+
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def returncode(self, timeout=5):
+        try:
+            return self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            return self.proc.returncode
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class FaceWorkerPool:
+    def __init__(self, size, python_exe, job_timeout, startup_timeout, script=WORKER_SCRIPT,
+                 respawn_backoff=5.0, respawn_backoff_max=300.0):
+        self.size = size
+        self.python_exe = python_exe
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self.script = script
+        self.respawn_backoff = respawn_backoff
+        self.respawn_backoff_max = respawn_backoff_max
+
+        self._lock = threading.Lock()
+        self._spawn_failures = 0
+        self._retry_at = 0.0
+
+        # One slot per worker. A slot holds None until its worker is spawned
+        # (or after it died), so workers start lazily and respawn on demand.
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _respawn_wait(self):
+        # Seconds until the next spawn may be tried (0 when it may be tried now)
+        with self._lock:
+            return max(self._retry_at - time.monotonic(), 0.0)
+
+    def _spawn(self):
+        try:
+            with profiling.stage("worker_spawn"):
+                worker = FaceWorker(self.python_exe, self.script)
+                try:
+                    reply = worker.wait_ready(self.startup_timeout)
+                except Exception:
+                    worker.kill()
+                    raise
+        except Exception:
+            with self._lock:
+                self._spawn_failures += 1
+                delay = min(self.respawn_backoff * 2 ** (self._spawn_failures - 1), self.respawn_backoff_max)
+                self._retry_at = time.monotonic() + delay
+            raise
+        with self._lock:
+            self._spawn_failures = 0
+            self._retry_at = 0.0
+        if "model_load_ms" in reply:
+            profiling.record("worker_model_load", reply["model_load_ms"])
+        return worker
+
+    def _failure(self, worker, message):
+        code = worker.returncode()
+        if code in SEGFAULT_CODES:
+            return FaceResult("crashed", error=message, returncode=code)
+        return FaceResult("error", error=f"{message} (exit code {code})", returncode=code)
+
+    def run(self, job, payload=None):
+        # `payload` (raw image bytes) is streamed to the worker over its pipe
+        # right after the job line, so uploads never have to touch the disk.
+        try:
+            with profiling.stage("worker_wait"):
+                worker = self._slots.get(timeout=self.job_timeout)
+        except queue.Empty:
+            return FaceResult("timeout", error="No free face worker")
+
+        try:
+            if worker is None or not worker.alive():
+                wait = self._respawn_wait()
+                if wait:
+                    worker = None
+                    return FaceResult("error", error=f"Face worker failed to start; next try in {wait:.0f}s")
+                try:
+                    worker = self._spawn()
+                except TimeoutError:
+                    worker = None
+                    return FaceResult("timeout", error="Face worker did not start in time")
+                except (WorkerDied, OSError) as e:
+                    worker = None
+                    return FaceResult("error", error=f"Face worker failed to start: {str(e)}")
+
+            try:
+                with profiling.stage("worker_job"):
+                    worker.send(job, payload)
+                    data = worker.read_message(time.monotonic() + self.job_timeout)
+                return FaceResult("ok", data=data)
+            except TimeoutError:
+                worker.kill()
+                worker = None
+                return FaceResult("timeout", error="Face verification job timed out")
+            except WorkerDied as e:
+                result = self._failure(worker, str(e))
+                worker = None
+                return result
+            except ValueError:
+                # Garbage on the pipe means we lost framing; start fresh.
+                worker.kill()
+                worker = None
+                return FaceResult("error", error="Unreadable face worker output")
+        finally:
+            self._slots.put(worker)
+
+    def warm(self):
+        """Start every worker now instead of on first use (see FACE_PRELOAD_ON_START)."""
+        for _ in range(self.size):
+            # The slot queue is FIFO, so this visits each slot once
+            worker = self._slots.get()
+            try:
+                if (worker is None or not worker.alive()) and not self._respawn_wait():
+                    worker = self._spawn()
+            except Exception as e:
+                logger.error(f"Could not pre-start a face worker: {str(e)}")
+                worker = None
+            finally:
+                self._slots.put(worker)
+
+    def close(self):
+        while True:
+            try:
+                worker = self._slots.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_face_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = FaceWorkerPool(
+                    size=settings.FACE_WORKER_POOL_SIZE,
+                    python_exe=settings.FACE_WORKER_PYTHON,
+                    job_timeout=settings.FACE_WORKER_TIMEOUT,
+                    startup_timeout=settings.FACE_WORKER_STARTUP_TIMEOUT,
+                    respawn_backoff=settings.FACE_WORKER_RESPAWN_BACKOFF,
+                    respawn_backoff_max=settings.FACE_WORKER_RESPAWN_BACKOFF_MAX,
+                )
+                atexit.register(_pool.close)
+    return _pool
@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import time
 
 # CRITICAL: Set this BEFORE other imports
 os.environ["NUMPY_RELAX_UPPER_BOUND"] = "1"
@@ -8,31 +9,134 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' # Suppress TF logs
 
 try:
     from deepface import DeepFace
+    import cv2
     import numpy as np
 except ImportError as e:
     print(json.dumps({"error": f"Import error: {str(e)}"}))
     sys.exit(1)
 
-def run_verification(temp_path, db_path):
+MODEL_NAME = "VGG-Face"
+
+
+def find_match(img, db_path):
     try:
         # Perform Face Verification
-        dfs = DeepFace.find(img_path=temp_path, db_path=db_path, enforce_detection=False, silent=True)
-        
+        dfs = DeepFace.find(img_path=img, db_path=db_path, model_name=MODEL_NAME,
+                            enforce_detection=False, silent=True)
+
         if len(dfs) > 0 and len(dfs[0]) > 0:
             matched_df = dfs[0]
             result_path = matched_df.iloc[0]['identity']
-            print(json.dumps({"success": True, "identity": result_path}))
-        else:
-            print(json.dumps({"success": False, "error": "Face not recognized"}))
-            
+            return {"success": True, "identity": result_path}
+        return {"success": False, "error": "Face not recognized"}
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def embed(img, timings):
+    try:
+        # Detect, then embed the (BGR) face with detection skipped - what
+        # DeepFace.represent does in one call, split so each step is timed
+        started = time.perf_counter()
+        faces = DeepFace.extract_faces(img_path=img, enforce_detection=False, color_face="bgr")
+        timings["detect"] = (time.perf_counter() - started) * 1000
+        if not faces:
+            return {"success": False, "error": "No face found"}
+
+        started = time.perf_counter()
+        represented = DeepFace.represent(img_path=faces[0]["face"], model_name=MODEL_NAME,
+                                         detector_backend="skip", enforce_detection=False)
+        timings["embed"] = (time.perf_counter() - started) * 1000
+        return {"success": True, "embedding": represented[0]["embedding"]}
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def run_verification(temp_path, db_path):
+    print(json.dumps(find_match(temp_path, db_path)))
+
+
+def decode_image(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image")
+    return img
+
+
+def serve():
+    # Long-lived mode used by parking.face_pool: load the model once, then
+    # answer one JSON job per line on stdin with one JSON line on stdout.
+    # A job with "image_size" is followed by that many raw image bytes, which
+    # are decoded in memory instead of being read from a file.
+    # DeepFace/TF like to print, so the protocol gets a private copy of
+    # stdout and everything else is pushed to stderr.
+    out = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    started = time.perf_counter()
+    try:
+        DeepFace.build_model(MODEL_NAME)
     except Exception as e:
-        print(json.dumps({"success": False, "error": str(e)}))
+        out.write(json.dumps({"ready": False, "error": str(e)}) + "\n")
+        sys.exit(1)
+    model_load_ms = (time.perf_counter() - started) * 1000
+    out.write(json.dumps({"ready": True, "model_load_ms": model_load_ms}) + "\n")
+
+    stdin = sys.stdin.buffer
+    while True:
+        line = stdin.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("not a JSON object")
+        except ValueError as e:
+            # No telling whether image bytes follow, so the rest of stdin cannot
+            # be framed: exit, and parking.face_pool starts a fresh worker
+            print(f"Unreadable job header, exiting: {str(e)}", file=sys.stderr)
+            sys.exit(2)
+
+        # Stage timings go back with the result (see parking.profiling)
+        timings = {}
+        try:
+            img = job.get("img_path")
+            if job.get("image_size"):
+                started = time.perf_counter()
+                data = stdin.read(job["image_size"])
+                if len(data) < job["image_size"]:
+                    print("stdin closed mid-image, exiting", file=sys.stderr)
+                    sys.exit(2)
+                img = decode_image(data)
+                timings["decode"] = (time.perf_counter() - started) * 1000
+                timings["image"] = f"{img.shape[1]}x{img.shape[0]}"
+
+            if job.get("op") == "embed":
+                result = embed(img, timings)
+            else:
+                started = time.perf_counter()
+                result = find_match(img, job["db_path"])
+                timings["find"] = (time.perf_counter() - started) * 1000
+        except (ValueError, KeyError) as e:
+            result = {"success": False, "error": f"Bad job: {str(e)}"}
+        result["timings"] = timings
+        out.write(json.dumps(result) + "\n")
+
 
 if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+        serve()
+        sys.exit(0)
+
     if len(sys.argv) < 3:
         print(json.dumps({"error": "Missing arguments"}))
         sys.exit(1)
-        
+
     temp_path = sys.argv[1]
     db_path = sys.argv[2]
     run_verification(temp_path, db_path)
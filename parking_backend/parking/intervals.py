@@ -0,0 +1,202 @@
+# intervals.py
+# Reservation time windows: overlap_counts() is the booking check (read from
+# the DB, under the spot's lock - see parking.allocator), and IntervalIndex
+# is a per-spot cache of the windows that answers "free windows for spot X"
+# without scanning the spot's reservations.
+#
+# Reservations only carry start/end times; the day is the one they were
+# created on (created_at, local time) and an end at or before the start
+# means the booking runs past midnight - the same rule the dashboard uses
+# when it computes duration_hours.
+#
+# Each spot keeps its intervals sorted by start. Because no interval is
+# longer than the longest one seen on that spot, every interval overlapping
+# [start, end) begins in [start - longest, end): two bisects bound the
+# candidates, so a lookup costs O(log n + k).
+#
+# A spot's cache holds only the rows created in the days around the windows
+# asked for (created_bounds, the same range overlap_counts reads), so a
+# reload costs the same however old the table is.
+#
+# Saves and deletes in this process reach the cache through parking.signals;
+# those made by other server processes show up when a spot's cache is older
+# than INTERVAL_INDEX_MAX_AGE and is read again.
+import bisect
+import itertools
+import threading
+import time as monotonic_time
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def reservation_window(day, start_time, end_time):
+    start = datetime.combine(day, start_time)
+    end = datetime.combine(day, end_time)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def window_for(reservation):
+    day = timezone.localdate(reservation.created_at) if reservation.created_at else timezone.localdate()
+    return reservation_window(day, reservation.start_time, reservation.end_time)
+
+
+def created_bounds(start, end):
+    """[first, last) created_at range of the rows whose window can overlap [start, end)."""
+    # A window starts on its row's created_at day and ends at most a day later
+    first = timezone.make_aware(datetime.combine(start.date() - timedelta(days=1), time.min))
+    last = timezone.make_aware(datetime.combine(end.date() + timedelta(days=1), time.min))
+    return first, last
+
+
+def overlap_counts(branch, spot_ids, start, end):
+    """{spot_id: reservations whose window overlaps [start, end)}, counted from the DB."""
+    from .models import Reservation
+
+    first, last = created_bounds(start, end)
+    rows = (Reservation.objects.filter(branch=branch, spot_id__in=[str(s) for s in spot_ids],
+                                       created_at__gte=first, created_at__lt=last)
+            .only('spot_id', 'start_time', 'end_time', 'created_at'))
+    counts = {}
+    for res in rows:
+        res_start, res_end = window_for(res)
+        if res_start < end and res_end > start:
+            counts[res.spot_id] = counts.get(res.spot_id, 0) + 1
+    return counts
+
+
+class SpotIntervals:
+    def __init__(self, first, last):
+        self.first = first  # rows created in [first, last) are loaded
+        self.last = last
+        self.starts = []    # sorted (start, seq)
+        self.entries = {}   # seq -> (start, end, pk)
+        self.by_pk = {}     # pk -> seq
+        self.longest = timedelta(0)
+        self.loaded_at = monotonic_time.monotonic()
+
+    def add(self, seq, start, end, pk=None):
+        bisect.insort(self.starts, (start, seq))
+        self.entries[seq] = (start, end, pk)
+        if pk is not None:
+            self.by_pk[pk] = seq
+        self.longest = max(self.longest, end - start)
+
+    def covers(self, first, last):
+        return self.first <= first and last <= self.last
+
+    def remove_seq(self, seq):
+        start, _, pk = self.entries.pop(seq)
+        i = bisect.bisect_left(self.starts, (start, seq))
+        del self.starts[i]
+        if pk is not None:
+            self.by_pk.pop(pk, None)
+
+    def overlapping(self, start, end):
+        lo = bisect.bisect_left(self.starts, (start - self.longest, -1))
+        hi = bisect.bisect_left(self.starts, (end, -1))
+        for interval_start, seq in self.starts[lo:hi]:
+            interval_end = self.entries[seq][1]
+            if interval_end > start:
+                yield interval_start, interval_end
+
+    def free_windows(self, start, end, capacity):
+        # Sweep the overlapping intervals; free wherever fewer than `capacity` run at once
+        events = []
+        for interval_start, interval_end in self.overlapping(start, end):
+            events.append((max(interval_start, start), 1))
+            events.append((min(interval_end, end), -1))
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        windows = []
+        active = 0
+        cursor = start
+        for moment, delta in events:
+            if active < capacity and moment > cursor:
+                windows.append((cursor, moment))
+            active += delta
+            cursor = moment
+        if active < capacity and end > cursor:
+            windows.append((cursor, end))
+
+        merged = []
+        for window in windows:
+            if merged and merged[-1][1] == window[0]:
+                merged[-1] = (merged[-1][0], window[1])
+            else:
+                merged.append(window)
+        return merged
+
+
+class IntervalIndex:
+    def __init__(self, capacities, max_age):
+        self.capacities = capacities  # spot_id -> vehicles at once
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._spots = {}              # (branch, spot_id) -> SpotIntervals
+        self._seq = itertools.count()
+
+    def _spot(self, branch, spot_id, start, end):
+        key = (branch, str(spot_id))
+        spot = self._spots.get(key)
+        first, last = created_bounds(start, end)
+        fresh = spot is not None and monotonic_time.monotonic() - spot.loaded_at <= self.max_age
+        if not fresh or not spot.covers(first, last):
+            from .models import Reservation
+
+            if fresh:
+                # Still current, just narrower: widen it so alternating days don't evict each other
+                first, last = min(first, spot.first), max(last, spot.last)
+            spot = SpotIntervals(first, last)
+            rows = (Reservation.objects.filter(branch=branch, spot_id=spot_id,
+                                               created_at__gte=first, created_at__lt=last)
+                    .only('pk', 'start_time', 'end_time', 'created_at'))
+            for res in rows:
+                start, end = window_for(res)
+                spot.add(next(self._seq), start, end, res.pk)
+            self._spots[key] = spot
+        return spot
+
+    def track(self, reservation):
+        with self._lock:
+            spot = self._spots.get((reservation.branch, str(reservation.spot_id)))
+            if spot is None:
+                return  # not loaded yet; the row is read from the DB on first use
+            if reservation.pk in spot.by_pk:
+                spot.remove_seq(spot.by_pk[reservation.pk])
+            if reservation.created_at and not spot.first <= reservation.created_at < spot.last:
+                return  # outside the loaded range; read from the DB when that range is asked for
+            start, end = window_for(reservation)
+            spot.add(next(self._seq), start, end, reservation.pk)
+
+    def forget(self, reservation):
+        with self._lock:
+            spot = self._spots.get((reservation.branch, str(reservation.spot_id)))
+            if spot is not None and reservation.pk in spot.by_pk:
+                spot.remove_seq(spot.by_pk[reservation.pk])
+
+    def free_windows(self, branch, spot_id, start, end):
+        capacity = self.capacities.get(str(spot_id), 1)
+        with self._lock:
+            return self._spot(branch, spot_id, start, end).free_windows(start, end, capacity)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_interval_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                capacities = {
+                    str(spot_id): conf["capacity"]
+                    for conf in settings.PARKING_LAYOUT.values()
+                    for spot_id in conf["spots"]
+                }
+                _index = IntervalIndex(capacities, settings.INTERVAL_INDEX_MAX_AGE)
+    return _index
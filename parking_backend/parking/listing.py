@@ -0,0 +1,141 @@
+# listing.py
+# Read-only list APIs for reservations, passes and employees.
+#
+# Pages are keyset pages on (created_at, id) - the (created_at, id) index
+# serves both the WHERE and the ORDER BY, so page 5000 costs the same as
+# page 1, unlike OFFSET. The cursor is opaque to clients: base64 of the last
+# row's created_at and id.
+#
+# ?fields= picks the columns (the query only selects those), filters are
+# limited to indexed columns, and the JSON body is streamed row by row from
+# a server-side iterator, so a large ?limit= export is never held in memory.
+import base64
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+
+from .models import Employee, MonthlyPass, Reservation, YearlyPass, normalize_email
+
+
+class ListSpec:
+    def __init__(self, model, fields, filters, media_fields=()):
+        self.model = model
+        self.fields = fields              # public fields, in output order
+        self.filters = filters            # query param -> (lookup, normaliser), indexed columns only
+        self.media_fields = media_fields  # file fields rendered as MEDIA_URL paths
+
+
+LISTS = {
+    "reservations": ListSpec(
+        Reservation,
+        # password is deliberately not listable
+        ('id', 'branch', 'spot_id', 'spot_type', 'name', 'email', 'start_time', 'end_time',
+         'duration_hours', 'is_scanned', 'created_at'),
+        {"branch": ('branch', str), "spot_id": ('spot_id', str), "email": ('email', normalize_email)},
+    ),
+    "monthly_passes": ListSpec(
+        MonthlyPass,
+        ('id', 'name', 'email', 'age', 'vehicle_number', 'start_time', 'end_time',
+         'start_date', 'end_date', 'created_at'),
+        {"email": ('email', normalize_email), "vehicle_number": ('vehicle_number', str)},
+    ),
+    "yearly_passes": ListSpec(
+        YearlyPass,
+        ('id', 'name', 'email', 'age', 'vehicle_number', 'start_time', 'end_time',
+         'start_date', 'end_date', 'created_at'),
+        {"email": ('email', normalize_email), "vehicle_number": ('vehicle_number', str)},
+    ),
+    "employees": ListSpec(
+        Employee,
+        ('id', 'name', 'email', 'phone', 'employee_id', 'age', 'vehicle_number', 'profile_pic', 'created_at'),
+        {"email": ('email', str), "employee_id": ('employee_id', str)},
+        media_fields=('profile_pic',),
+    ),
+}
+
+
+class ListError(Exception):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, int(pk)
+    except ValueError:
+        raise ListError("Invalid cursor.")
+
+
+def _parse(spec, params):
+    fields = spec.fields
+    if params.get('fields'):
+        fields = tuple(f.strip() for f in params['fields'].split(',') if f.strip())
+        unknown = [f for f in fields if f not in spec.fields]
+        if unknown:
+            raise ListError(f"Unknown fields: {', '.join(unknown)}.")
+
+    try:
+        limit = int(params.get('limit', settings.LIST_PAGE_SIZE))
+    except ValueError:
+        raise ListError("limit must be a number.")
+    if not 1 <= limit <= settings.LIST_MAX_PAGE_SIZE:
+        raise ListError(f"limit must be between 1 and {settings.LIST_MAX_PAGE_SIZE}.")
+
+    queryset = spec.model.objects.all()
+    for param, (lookup, normalise) in spec.filters.items():
+        if param in params:
+            queryset = queryset.filter(**{lookup: normalise(params[param])})
+    if params.get('cursor'):
+        created_at, pk = decode_cursor(params['cursor'])
+        # The created_at__gte range is what lets the index seek to the cursor;
+        # the OR alone is not sargable and scans from the first row again
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk),
+                                   created_at__gte=created_at)
+
+    # id + created_at are always fetched: the next cursor is built from them
+    columns = tuple(dict.fromkeys(fields + ('id', 'created_at')))
+    return fields, limit, queryset.order_by('created_at', 'id').values(*columns)
+
+
+def _stream(spec, fields, limit, rows):
+    encoder = DjangoJSONEncoder()
+    media_url = settings.MEDIA_URL
+    yield '{"results": ['
+    last = None
+    sent = 0
+    for row in rows.iterator(chunk_size=min(limit + 1, 1000)):
+        if sent == limit:
+            # There is at least one more row: hand out a cursor for it
+            yield '], "next": ' + json.dumps(encode_cursor(last['created_at'], last['id'])) + '}'
+            return
+        item = {f: row[f] for f in fields}
+        for f in spec.media_fields:
+            if f in item:
+                item[f] = media_url + item[f] if item[f] else None
+        yield (',' if sent else '') + encoder.encode(item)
+        last = row
+        sent += 1
+    yield '], "next": null}'
+
+
+def list_response(name, params):
+    spec = LISTS[name]
+    try:
+        fields, limit, rows = _parse(spec, params)
+    except ListError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    # Fetch limit + 1 rows: the extra one only tells us whether there is a next page
+    return StreamingHttpResponse(_stream(spec, fields, limit, rows[:limit + 1]), content_type="application/json")
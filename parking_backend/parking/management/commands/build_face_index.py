@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from parking.face_index import embed_image, get_face_index
+from parking.models import Employee
+from parking.orb_store import get_orb_store
+
+
+class Command(BaseCommand):
+    help = "Rebuild the employee face-embedding index and the ORB fallback descriptors."
+
+    def handle(self, *args, **options):
+        items = []
+        failed = 0
+        for employee in Employee.objects.exclude(profile_pic="").exclude(profile_pic__isnull=True):
+            embedding = embed_image(employee.profile_pic.path)
+            if embedding is None:
+                failed += 1
+                self.stderr.write(f"Skipped employee {employee.pk} ({employee.profile_pic.name})")
+                continue
+            items.append((employee.pk, embedding))
+
+        get_face_index().rebuild(items)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(items)} employees ({failed} skipped)."))
+
+        orb_store = get_orb_store()
+        orb_store.sync_employees()
+        self.stdout.write(self.style.SUCCESS(f"Stored ORB descriptors for {len(orb_store.entries())} employees."))
@@ -0,0 +1,68 @@
+import json
+import math
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from parking.profiling import sample_files
+
+# Pipeline order, so the table reads top to bottom like a request
+STAGE_ORDER = ('queue_wait', 'upload_write', 'index_load', 'worker_wait', 'worker_spawn', 'worker_model_load',
+               'worker_job', 'worker_decode', 'worker_detect', 'worker_embed', 'worker_find', 'index_search',
+               'employee_lookup', 'orb_decode', 'orb_descriptors', 'orb_store_load', 'orb_match', 'total')
+
+
+def percentile(ordered, p):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = "Dump face verification stage timings (p50/p90/p99) collected by every server process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Print JSON instead of a table.")
+        parser.add_argument('--reset', action='store_true', help="Delete the collected samples afterwards.")
+
+    def handle(self, *args, **options):
+        # Files of processes gone for FACE_PROFILE_MAX_AGE are deleted, not merged
+        files = sample_files(settings.FACE_PROFILE_DIR, settings.FACE_PROFILE_MAX_AGE)
+        samples = {}
+        for path in files:
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f"Skipped {path}: {str(e)}")
+                continue
+            for name, values in data.get('samples', {}).items():
+                samples.setdefault(name, []).extend(values)
+
+        order = {name: i for i, name in enumerate(STAGE_ORDER)}
+        report = {}
+        for name in sorted(samples, key=lambda n: (order.get(n, len(order)), n)):
+            values = sorted(samples[name])
+            report[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p90_ms": round(percentile(values, 90), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "max_ms": round(values[-1], 1),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps({"processes": len(files), "stages": report}, indent=2))
+        elif not report:
+            self.stdout.write(f"No face profile samples in {settings.FACE_PROFILE_DIR}.")
+        else:
+            self.stdout.write(f"{'stage':<22}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+            for name, row in report.items():
+                self.stdout.write(f"{name:<22}{row['count']:>8}{row['p50_ms']:>10}{row['p90_ms']:>10}"
+                                  f"{row['p99_ms']:>10}{row['max_ms']:>10}")
+            self.stdout.write(f"({len(files)} process files)")
+
+        if options['reset']:
+            for path in files:
+                os.remove(path)
+            self.stdout.write(self.style.SUCCESS(f"Removed {len(files)} sample files."))
@@ -0,0 +1,250 @@
+import glob
+import io
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from parking.traffic import synthesize
+
+
+def percentile(ordered, p):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov D of two sorted samples (largest gap between their CDFs)."""
+    i = j = 0
+    d = 0.0
+    while i < len(a) and j < len(b):
+        x = min(a[i], b[j])
+        while i < len(a) and a[i] <= x:
+            i += 1
+        while j < len(b) and b[j] <= x:
+            j += 1
+        d = max(d, abs(i / len(a) - j / len(b)))
+    return d
+
+
+def read_capture(paths):
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl*"))) if os.path.isdir(path) else [path])
+    if not files:
+        raise CommandError("No capture files found.")
+
+    entries = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    # Several worker processes write their own files: merge back into arrival order
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+_upload = None
+
+
+def upload_bytes():
+    # One stand-in photo for every captured upload; only its size class matters to the server
+    global _upload
+    if _upload is None:
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.effect_noise((480, 640), 48).convert("RGB").save(buffer, "JPEG", quality=85)
+        _upload = buffer.getvalue()
+    return _upload
+
+
+def build_request(entry, n):
+    path = entry["path"]
+    if entry.get("query"):
+        path += "?" + urlencode(synthesize(entry["query"], n), doseq=True)
+
+    body_type, body = entry.get("body_type"), entry.get("body")
+    if body_type == "json":
+        return path, json.dumps(synthesize(body, n)).encode(), "application/json"
+    if body_type == "form":
+        return path, urlencode(synthesize(body, n)).encode(), "application/x-www-form-urlencoded"
+    if body_type == "multipart":
+        boundary = uuid.uuid4().hex
+        parts = []
+        for key, value in (body or {}).items():
+            if isinstance(value, dict) and "$file" in value:
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"; filename="replay.jpg"\r\n'
+                             f'Content-Type: image/jpeg\r\n\r\n'.encode() + upload_bytes() + b"\r\n")
+            else:
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n'
+                             f'{synthesize(value, n)}\r\n'.encode())
+        parts.append(f"--{boundary}--\r\n".encode())
+        return path, b"".join(parts), f"multipart/form-data; boundary={boundary}"
+    return path, None, None
+
+
+class Replayer:
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        self.connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        # One keep-alive connection per replay thread
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        return connection
+
+    def _drop(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def send(self, method, path, body, content_type):
+        """Returns (status, seconds to the response headers); status 0 for a failed request."""
+        headers = {"Content-Type": content_type} if content_type else {}
+        started = time.perf_counter()
+        try:
+            connection = self._connection()
+            connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = connection.getresponse()
+            elapsed = time.perf_counter() - started
+            if response.getheader("Content-Type", "").startswith("text/event-stream"):
+                self._drop()  # a scan stream stays open for minutes: headers are the answer
+            else:
+                response.read()
+                if response.will_close:
+                    self._drop()
+            return response.status, elapsed
+        except (OSError, ValueError):  # refused, reset, timed out...
+            self._drop()
+            return 0, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Replay captured API traffic (TRAFFIC_CAPTURE) against a running instance and compare latency between runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', nargs='*',
+                            help="Capture files or directories (default: TRAFFIC_CAPTURE_DIR).")
+        parser.add_argument('--base-url', default="http://127.0.0.1:8000")
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help="Playback speed: 1 = as captured, 10 = ten times faster, 0 = no pauses.")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Requests in flight at once (1 plays the capture back one request at a time).")
+        parser.add_argument('--route', action='append', default=[],
+                            help="Only replay routes containing this text (repeatable).")
+        parser.add_argument('--limit', type=int, default=0, help="Stop after this many requests.")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Seconds before a request counts as failed.")
+        parser.add_argument('--output', help="Write this run's latencies here (JSON), for a later --compare.")
+        parser.add_argument('--compare', help="A previous --output file to compare this run against "
+                                                 "(replay each run against the same fresh database copy).")
+
+    def handle(self, *args, **options):
+        entries = read_capture(options['capture'] or [settings.TRAFFIC_CAPTURE_DIR])
+        if options['route']:
+            entries = [e for e in entries if any(text in e['route'] for text in options['route'])]
+        if options['limit']:
+            entries = entries[:options['limit']]
+        if not entries:
+            raise CommandError("Nothing to replay.")
+
+        first_ts = entries[0]['ts']
+        pace = f"{options['speed']}x speed" if options['speed'] else "full speed"
+        self.stdout.write(f"Replaying {len(entries)} requests ({entries[-1]['ts'] - first_ts:.1f}s captured) "
+                          f"at {pace}, concurrency {options['concurrency']}...")
+
+        replayer = Replayer(options['base_url'], options['timeout'])
+        results = {}  # route -> [(status, seconds)]
+        results_lock = threading.Lock()
+        slots = threading.Semaphore(options['concurrency'])
+        max_lag = 0.0
+
+        def run(entry, n):
+            try:
+                status, seconds = replayer.send(entry['method'], *build_request(entry, n))
+                with results_lock:
+                    results.setdefault(entry['route'], []).append((status, seconds))
+            finally:
+                slots.release()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for n, entry in enumerate(entries):
+                if options['speed']:
+                    due = started + (entry['ts'] - first_ts) / options['speed']
+                    pause = due - time.monotonic()
+                    if pause > 0:
+                        time.sleep(pause)
+                slots.acquire()
+                if options['speed']:
+                    # How far behind the captured timing we are (server or replay too slow)
+                    max_lag = max(max_lag, time.monotonic() - due)
+                pool.submit(run, entry, n)
+        wall = time.monotonic() - started
+
+        summary = {
+            "base_url": options['base_url'],
+            "speed": options['speed'],
+            "concurrency": options['concurrency'],
+            "requests": len(entries),
+            "seconds": round(wall, 2),
+            "max_lag_ms": round(max_lag * 1000, 1),
+            "routes": {},
+        }
+        for route, outcomes in sorted(results.items()):
+            latencies = sorted(seconds * 1000 for _, seconds in outcomes)
+            summary["routes"][route] = {
+                "count": len(outcomes),
+                "errors": sum(1 for status, _ in outcomes if status == 0 or status >= 500),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "latencies_ms": [round(ms, 2) for ms in latencies],
+            }
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)["routes"]
+        self._report(summary, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(summary, f)
+
+    def _report(self, summary, baseline):
+        self.stdout.write(f"Done in {summary['seconds']}s, at most {summary['max_lag_ms']} ms behind the capture's timing.")
+        header = f"{'route':<48}{'count':>7}{'errors':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        if baseline is not None:
+            header += f"{'p50 was':>9}{'p95 was':>9}{'p99 was':>9}   KS D"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for route, stats in summary["routes"].items():
+            line = (f"{route:<48}{stats['count']:>7}{stats['errors']:>7}"
+                    f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+            old = (baseline or {}).get(route)
+            if old:
+                a, b = stats['latencies_ms'], old['latencies_ms']
+                d = ks_statistic(a, b)
+                # Two-sample KS at the 5% level: D above this means the distribution moved
+                critical = 1.358 * math.sqrt((len(a) + len(b)) / (len(a) * len(b)))
+                line += f"{old['p50_ms']:>9}{old['p95_ms']:>9}{old['p99_ms']:>9}   {d:.3f}"
+                if d > critical:
+                    line += " faster" if stats['p50_ms'] <= old['p50_ms'] else " SLOWER"
+            self.stdout.write(line)
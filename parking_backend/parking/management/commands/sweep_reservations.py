@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from parking.allocator import get_allocator
+from parking.intervals import get_interval_index, reservation_window
+from parking.models import Reservation, ReservationArchive
+
+ARCHIVED_FIELDS = ('branch', 'spot_id', 'spot_type', 'name', 'email', 'password',
+                   'start_time', 'end_time', 'duration_hours', 'is_scanned', 'created_at')
+
+
+class Command(BaseCommand):
+    help = ("Move reservations whose time window is over into the archive table, "
+            "in short batches so SQLite writers are never blocked for long.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.RESERVATION_SWEEP_BATCH_SIZE,
+                            help="Rows read per batch (default RESERVATION_SWEEP_BATCH_SIZE).")
+        parser.add_argument('--grace-minutes', type=int, default=0,
+                            help="Only sweep reservations that ended at least this long ago.")
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help="Seconds to sleep between batches so other writers get the lock.")
+        parser.add_argument('--max-batches', type=int, default=0,
+                            help="Stop after this many batches (0 = until done).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would move without writing anything.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.localtime().replace(tzinfo=None) - timedelta(minutes=options['grace_minutes'])
+
+        # A window starts on its created_at day, so nothing created after the
+        # cutoff's day can have ended yet: each run reads only the rows up to
+        # there, oldest first, instead of the whole table from id 0
+        horizon = timezone.make_aware(datetime.combine(cutoff.date() + timedelta(days=1), datetime.min.time()))
+
+        last = None  # (created_at, pk) of the last row read
+        batches = moved_total = scanned_total = 0
+        started = time.monotonic()
+        while True:
+            # Keyset pagination on the (created_at, id) index: every batch is an index range scan
+            candidates = Reservation.objects.filter(created_at__lt=horizon)
+            if last:
+                candidates = candidates.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], pk__gt=last[1]),
+                                               created_at__gte=last[0])
+            rows = list(candidates.order_by('created_at', 'id').values('pk', *ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            last = (rows[-1]['created_at'], rows[-1]['pk'])
+            scanned_total += len(rows)
+
+            expired = []
+            for row in rows:
+                day = timezone.localdate(row['created_at'])
+                _, end = reservation_window(day, row['start_time'], row['end_time'])
+                if end <= cutoff:
+                    expired.append(row)
+
+            batch_started = time.monotonic()
+            if expired and not options['dry_run']:
+                # One short transaction per batch: copy, then delete from the hot table
+                with transaction.atomic():
+                    ReservationArchive.objects.bulk_create([
+                        ReservationArchive(original_id=row['pk'], **{f: row[f] for f in ARCHIVED_FIELDS})
+                        for row in expired
+                    ])
+                    # A plain DELETE: .delete() would SELECT the rows again and send post_delete
+                    # one row at a time (nothing references a reservation, so no cascade is skipped)
+                    gone = Reservation.objects.filter(pk__in=[row['pk'] for row in expired])
+                    gone._raw_delete(gone.db)
+                self.forget(expired)
+            elapsed = (time.monotonic() - batch_started) * 1000
+
+            batches += 1
+            moved_total += len(expired)
+            verb = "would move" if options['dry_run'] else "moved"
+            self.stdout.write(f"Batch {batches}: scanned {len(rows)}, {verb} {len(expired)} in {elapsed:.1f} ms "
+                              f"(up to id {last[1]})")
+
+            if options['max_batches'] and batches >= options['max_batches']:
+                break
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {moved_total} of {scanned_total} reservations in {batches} batches "
+            f"({time.monotonic() - started:.2f} s)."
+        ))
+
+    @staticmethod
+    def forget(rows):
+        """The bookkeeping post_delete would do, once per batch."""
+        # Rollups need nothing: a window that is over keeps its minutes (parking.rollups)
+        interval_index = get_interval_index()
+        for row in rows:
+            interval_index.forget(Reservation(pk=row['pk'], branch=row['branch'], spot_id=row['spot_id']))
+        allocator = get_allocator()
+        for branch, spot_id in {(row['branch'], row['spot_id']) for row in rows}:
+            allocator.recount(branch, spot_id)
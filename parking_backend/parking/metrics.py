@@ -0,0 +1,251 @@
+# metrics.py
+# Request metrics in Prometheus text format (served at /metrics).
+#
+# Every thread writes into its own shard (a couple of plain dicts reached
+# through a threading.local), so recording a request takes no lock; the
+# shards are only summed when /metrics is scraped. A shard whose thread has
+# exited is folded into one shared "retired" shard (when a new thread
+# registers or on a scrape), so thread churn does not grow the list. Metrics
+# are per process:
+# with several workers, scrape each one (or put them behind a per-worker
+# port).
+#
+# MetricsMiddleware records, per route: latency histogram, request count by
+# status, response size histogram and DB query count / time. Queries are
+# counted by an execute_wrapper installed on each DB connection as it is
+# created; it reports into a contextvar, so queries run in sync_to_async
+# threads on behalf of an async view are counted too.
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+METRICS = {
+    # name: (type, help)
+    "parking_http_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "parking_http_request_duration_seconds": ("histogram", "Request latency by route and method."),
+    "parking_http_response_size_bytes": ("histogram", "Response body size by route (streamed bodies excluded)."),
+    "parking_db_queries_total": ("counter", "Database queries run while handling requests, by route."),
+    "parking_db_query_seconds_total": ("counter", "Time spent in database queries, by route."),
+    "parking_face_verifications_total": ("counter", "Face verifications by outcome (fallback_used counts ORB fallback attempts)."),
+    "parking_face_worker_failures_total": ("counter", "Face worker jobs that crashed, timed out or failed."),
+    "parking_face_index_empty_total": ("counter", "Verifications that found the embedding index empty (ORB only; a backfill is started)."),
+}
+
+
+class Shard:
+    def __init__(self):
+        self.counters = {}     # (name, labels) -> value
+        self.histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+
+    def merge_into(self, counters, histograms):
+        for key, value in list(self.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, row in list(self.histograms.items()):
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = list(row)
+            else:
+                for i, value in enumerate(row):
+                    total[i] += value
+
+
+_local = threading.local()
+_shards = []               # (thread, shard) of the threads still running
+_retired = Shard()         # what exited threads recorded
+_shards_lock = threading.Lock()
+
+
+def _retire_exited():
+    # Call with _shards_lock held; an exited thread never writes to its shard again
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            shard.merge_into(_retired.counters, _retired.histograms)
+    _shards[:] = alive
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = Shard()
+        with _shards_lock:  # once per thread
+            _retire_exited()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def inc(name, labels=(), amount=1):
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + amount
+
+
+def observe(name, labels, value, buckets):
+    histograms = _shard().histograms
+    key = (name, labels)
+    row = histograms.get(key)
+    if row is None:
+        row = histograms[key] = [0] * (len(buckets) + 2)
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            row[i] += 1
+            break
+    else:
+        row[len(buckets)] += 1
+    row[-1] += value
+
+
+# -----------------------------
+# DB query accounting
+# -----------------------------
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_query_stats = contextvars.ContextVar("parking_query_stats", default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+def _route(request):
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None else "<unmatched>"
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self._record(request, response, stats, started)
+        return response
+
+    async def _acall(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self._record(request, response, stats, started)
+        return response
+
+    @staticmethod
+    def _start():
+        stats = QueryStats()
+        return stats, _query_stats.set(stats), time.perf_counter()
+
+    @staticmethod
+    def _record(request, response, stats, started):
+        elapsed = time.perf_counter() - started
+        route = _route(request)
+        labels = (("route", route), ("method", request.method))
+        observe("parking_http_request_duration_seconds", labels, elapsed, LATENCY_BUCKETS)
+        inc("parking_http_requests_total", labels + (("status", str(response.status_code)),))
+        if not response.streaming:
+            observe("parking_http_response_size_bytes", (("route", route),), len(response.content), SIZE_BUCKETS)
+        if stats.count:
+            inc("parking_db_queries_total", (("route", route),), stats.count)
+            inc("parking_db_query_seconds_total", (("route", route),), stats.seconds)
+
+
+# -----------------------------
+# Exposition
+# -----------------------------
+def _collect():
+    counters, histograms = {}, {}
+    with _shards_lock:
+        _retire_exited()
+        _retired.merge_into(counters, histograms)
+        shards = [shard for _, shard in _shards]
+    for shard in shards:
+        shard.merge_into(counters, histograms)
+    return counters, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    counters, histograms = _collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+
+        buckets = SIZE_BUCKETS if name == "parking_http_response_size_bytes" else LATENCY_BUCKETS
+        for (metric, labels), row in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, row):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, (('le', _number(bound)),))} {cumulative}")
+            cumulative += row[len(buckets)]
+            lines.append(f'{name}_bucket{_labels(labels, (("le", "+Inf"),))} {cumulative}')
+            lines.append(f"{name}_sum{_labels(labels)} {_number(row[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def install():
+    # Called from AppConfig.ready, before any connection is opened
+    connection_created.connect(install_query_counter, dispatch_uid="parking_metrics_query_counter")
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0008_alter_employee_email_alter_employee_employee_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['spot_id', 'is_scanned', 'created_at'], name='reservation_spot_scan_idx'),
+        ),
+    ]
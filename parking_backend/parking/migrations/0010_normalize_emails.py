@@ -0,0 +1,41 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:02
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def lowercase_emails(apps, schema_editor):
+    # Existing rows were stored as typed; normalise them so the new
+    # equality lookups (and indexes) find them
+    for model_name in ('Reservation', 'MonthlyPass', 'YearlyPass'):
+        apps.get_model('parking', model_name).objects.update(email=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0009_reservation_spot_scan_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='monthlypass',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='yearlypass',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['spot_id', 'email'], name='reservation_spot_email_idx'),
+        ),
+    ]
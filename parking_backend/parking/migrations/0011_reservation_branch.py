@@ -0,0 +1,22 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0010_normalize_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='branch',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['branch', 'spot_id'], name='reservation_branch_spot_idx'),
+        ),
+    ]
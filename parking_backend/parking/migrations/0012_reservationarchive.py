@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0011_reservation_branch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('branch', models.CharField(blank=True, default='', max_length=100)),
+                ('spot_id', models.CharField(max_length=20)),
+                ('spot_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], max_length=10)),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('password', models.CharField(default='', max_length=100)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('duration_hours', models.FloatField()),
+                ('is_scanned', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0012_reservationarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch', models.CharField(blank=True, default='', max_length=100)),
+                ('spot_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], max_length=10)),
+                ('hour_start', models.DateTimeField()),
+                ('reservations', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('occupied_minutes', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='occupancyrollup',
+            constraint=models.UniqueConstraint(fields=('branch', 'spot_type', 'hour_start'), name='rollup_branch_type_hour_uniq'),
+        ),
+    ]
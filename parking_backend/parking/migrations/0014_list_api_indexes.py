@@ -0,0 +1,56 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0013_occupancyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='employee_id',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='monthlypass',
+            name='vehicle_number',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='yearlypass',
+            name='vehicle_number',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['created_at', 'id'], name='employee_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlypass',
+            index=models.Index(fields=['created_at', 'id'], name='monthlypass_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['created_at', 'id'], name='reservation_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='yearlypass',
+            index=models.Index(fields=['created_at', 'id'], name='yearlypass_created_id_idx'),
+        ),
+    ]
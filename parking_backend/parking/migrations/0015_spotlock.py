@@ -0,0 +1,26 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0014_list_api_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch', models.CharField(blank=True, default='', max_length=100)),
+                ('spot_id', models.CharField(max_length=20)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='spotlock',
+            constraint=models.UniqueConstraint(fields=('branch', 'spot_id'), name='spotlock_branch_spot_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0015_spotlock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['branch', 'created_at', 'id'], name='reservation_branch_created_idx'),
+        ),
+    ]
@@ -1,16 +1,30 @@
 from django.db import models
 
-class Reservation(models.Model):
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+class NormalizedEmailMixin:
+    # Emails are stored lowercase so lookups can use a plain (indexed)
+    # equality instead of email__iexact
+    def save(self, *args, **kwargs):
+        self.email = normalize_email(self.email)
+        super().save(*args, **kwargs)
+
+
+class Reservation(NormalizedEmailMixin, models.Model):
     SPOT_TYPE = (
         ('car', 'Car'),
         ('bike', 'Bike'),
     )
 
+    branch = models.CharField(max_length=100, blank=True, default="")
     spot_id = models.CharField(max_length=20)
     spot_type = models.CharField(max_length=10, choices=SPOT_TYPE)
 
     name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
 
     password = models.CharField(max_length=100, default="")
 
@@ -21,15 +35,91 @@ class Reservation(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves the scan / poll lookups (spot + scan state, newest first)
+            models.Index(fields=['spot_id', 'is_scanned', 'created_at'], name='reservation_spot_scan_idx'),
+            # Serves cancel_reservation (spot + owner)
+            models.Index(fields=['spot_id', 'email'], name='reservation_spot_email_idx'),
+            # Serves the spot allocator's per-branch occupancy counts
+            models.Index(fields=['branch', 'spot_id'], name='reservation_branch_spot_idx'),
+            # Keyset pagination of the list API
+            models.Index(fields=['created_at', 'id'], name='reservation_created_id_idx'),
+            # ...and of ?branch= listings (the other filters are selective enough to sort)
+            models.Index(fields=['branch', 'created_at', 'id'], name='reservation_branch_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.spot_id} - {self.name}"
 
 
-class MonthlyPass(models.Model):
+class ReservationArchive(models.Model):
+    # Reservations whose time window is over, moved here by the
+    # sweep_reservations command so the live table stays small
+    original_id = models.BigIntegerField(unique=True)
+    branch = models.CharField(max_length=100, blank=True, default="")
+    spot_id = models.CharField(max_length=20)
+    spot_type = models.CharField(max_length=10, choices=Reservation.SPOT_TYPE)
+
+    name = models.CharField(max_length=100)
+    email = models.EmailField(db_index=True)
+
+    password = models.CharField(max_length=100, default="")
+
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    duration_hours = models.FloatField()
+    is_scanned = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived {self.spot_id} - {self.name}"
+
+
+class OccupancyRollup(models.Model):
+    # One row per branch + spot type + hour, kept up to date by
+    # parking.rollups as reservations come and go; analytics reads only this
+    branch = models.CharField(max_length=100, blank=True, default="")
+    spot_type = models.CharField(max_length=10, choices=Reservation.SPOT_TYPE)
+    hour_start = models.DateTimeField()
+
+    reservations = models.IntegerField(default=0)      # bookings starting in this hour
+    cancellations = models.IntegerField(default=0)     # of those, cancelled before they ended
+    occupied_minutes = models.FloatField(default=0)    # spot-minutes booked inside this hour
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'spot_type', 'hour_start'], name='rollup_branch_type_hour_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.branch or '-'} {self.spot_type} {self.hour_start:%Y-%m-%d %H}:00"
+
+
+class SpotLock(models.Model):
+    # One row per branch + spot. A reservation locks it (parking.allocator.lock_spot)
+    # while it counts the spot's bookings and inserts its own, so two server
+    # processes cannot both take the last unit
+    branch = models.CharField(max_length=100, blank=True, default="")
+    spot_id = models.CharField(max_length=20)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'spot_id'], name='spotlock_branch_spot_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Lock {self.branch or '-'} {self.spot_id}"
+
+
+class MonthlyPass(NormalizedEmailMixin, models.Model):
     name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     age = models.IntegerField()
-    vehicle_number = models.CharField(max_length=20)
+    vehicle_number = models.CharField(max_length=20, db_index=True)
 
     start_time = models.TimeField()
     end_time = models.TimeField()
@@ -39,15 +129,21 @@ class MonthlyPass(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the list API
+            models.Index(fields=['created_at', 'id'], name='monthlypass_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Monthly - {self.vehicle_number}"
 
 
-class YearlyPass(models.Model):
+class YearlyPass(NormalizedEmailMixin, models.Model):
     name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     age = models.IntegerField()
-    vehicle_number = models.CharField(max_length=20)
+    vehicle_number = models.CharField(max_length=20, db_index=True)
 
     start_time = models.TimeField()
     end_time = models.TimeField()
@@ -57,19 +153,33 @@ class YearlyPass(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the list API
+            models.Index(fields=['created_at', 'id'], name='yearlypass_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Yearly - {self.vehicle_number}"
     
 
 class Employee(models.Model):
     name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     phone = models.CharField(max_length=15)
-    employee_id = models.CharField(max_length=20)
+    employee_id = models.CharField(max_length=20, db_index=True)
     age = models.IntegerField()
     vehicle_number = models.CharField(max_length=20)
     profile_pic = models.ImageField(upload_to='employee_faces/', blank=True, null=True)
 
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the list API
+            models.Index(fields=['created_at', 'id'], name='employee_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
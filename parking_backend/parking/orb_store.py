@@ -0,0 +1,157 @@
+# orb_store.py
+# Persisted ORB descriptors for the OpenCV fallback matcher. Employee-side
+# descriptors are computed once per face file (keyed by the SHA-1 of its
+# bytes) and kept in a single .npz together with the owning Employee pk, so a
+# fallback request only has to run ORB on the probe image and a match ends in
+# a primary-key lookup. Kept current by parking.signals.
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_KEY = "__digests__"
+PKS_KEY = "__pks__"
+
+
+def compute_descriptors(gray_img):
+    orb = cv2.ORB_create()
+    _, descriptors = orb.detectAndCompute(gray_img, None)
+    return descriptors
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OrbStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        # sha1 -> (employee pk, descriptors)
+        self._entries = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            self._entries = self._read() if mtime is not None else {}
+            self._mtime = mtime
+
+    def _read(self):
+        entries = {}
+        with np.load(self.path) as data:
+            if DIGESTS_KEY not in data.files:
+                logger.warning("ORB store has an old layout; run 'manage.py build_face_index' to rebuild it")
+                return entries
+            for digest, pk in zip(data[DIGESTS_KEY], data[PKS_KEY]):
+                digest = str(digest)
+                entries[digest] = (int(pk), data[digest])
+        return entries
+
+    def entries(self):
+        self._refresh()
+        return list(self._entries.values())
+
+    def _locked_update(self, change):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = self._read() if self.exists() else {}
+                change(entries)
+
+                arrays = {digest: descriptors for digest, (_, descriptors) in entries.items()}
+                arrays[DIGESTS_KEY] = np.array(list(entries.keys()), dtype=str)
+                arrays[PKS_KEY] = np.array([pk for pk, _ in entries.values()], dtype=np.int64)
+                tmp_path = f"{self.path}.tmp.npz"
+                np.savez(tmp_path, **arrays)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _describe(path):
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            return None
+        return compute_descriptors(img)
+
+    def add_file(self, employee_pk, path):
+        """Store descriptors for an employee's face file, replacing any older entry for that employee."""
+        digest = file_digest(path)
+        descriptors = self._describe(path)
+
+        def change(entries):
+            for key, (pk, _) in list(entries.items()):
+                if pk == employee_pk:
+                    del entries[key]
+            if descriptors is not None:
+                entries[digest] = (employee_pk, descriptors)
+        self._locked_update(change)
+
+    def remove_employee(self, employee_pk):
+        def change(entries):
+            for key, (pk, _) in list(entries.items()):
+                if pk == employee_pk:
+                    del entries[key]
+        self._locked_update(change)
+
+    def sync(self, items):
+        """Reconcile the store with an iterable of (employee_pk, face path); only new or changed files are described."""
+        files = {}
+        for pk, path in items:
+            if os.path.exists(path):
+                files[file_digest(path)] = (pk, path)
+
+        def change(entries):
+            for key in list(entries):
+                if key not in files:
+                    del entries[key]
+            for digest, (pk, path) in files.items():
+                if digest in entries:
+                    entries[digest] = (pk, entries[digest][1])
+                    continue
+                descriptors = self._describe(path)
+                if descriptors is not None:
+                    entries[digest] = (pk, descriptors)
+        self._locked_update(change)
+
+    def sync_employees(self):
+        from .models import Employee
+
+        employees = Employee.objects.exclude(profile_pic="").exclude(profile_pic__isnull=True)
+        self.sync((employee.pk, employee.profile_pic.path) for employee in employees)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_orb_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = OrbStore(os.path.join(settings.FACE_INDEX_DIR, 'orb_descriptors.npz'))
+    return _store
@@ -0,0 +1,132 @@
+# pass_holders.py
+# Which emails hold a pass that has not ended yet - read on every
+# cancellation to decide whether the QR step is skipped.
+#
+# The answer is a dict of email -> latest pass end_date, so a lookup is
+# exact and an entry simply stops counting once its end_date has passed.
+# Pass saves / deletes (parking.signals, parking.bulk) invalidate it once
+# their transaction commits, and the next lookup reloads it with one query
+# per pass table.
+#
+# On its own the dict is per process, and is reloaded every
+# PASS_HOLDER_CACHE_TTL seconds so other processes' writes show up. With
+# PASS_HOLDER_CACHE_ALIAS set to a cache shared by the workers (file-based,
+# memcached on localhost, ...) the loaded map and a generation counter live
+# there too: invalidating bumps the generation, and every worker drops its
+# copy on its next lookup. The shared map is stored with the generation it
+# was loaded under (and expires after the TTL anyway), so a map loaded just
+# before an invalidation and stored just after it is never used.
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import MonthlyPass, YearlyPass, normalize_email
+
+MAP_KEY = "parking:pass_holders:map"
+GENERATION_KEY = "parking:pass_holders:generation"
+
+
+class PassHolderCache:
+    def __init__(self, ttl, alias=""):
+        self.ttl = ttl
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._holders = None     # email -> latest end_date
+        self._loaded_at = 0.0
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _shared(self):
+        if not self.alias:
+            return None
+        from django.core.cache import caches
+
+        return caches[self.alias]
+
+    @staticmethod
+    def _load_from_db():
+        since = timezone.localdate()
+        holders = {}
+        for model in (MonthlyPass, YearlyPass):
+            rows = (model.objects.filter(end_date__gte=since)
+                    .values('email').annotate(until=Max('end_date')).values_list('email', 'until'))
+            for email, until in rows:
+                if holders.get(email) is None or until > holders[email]:
+                    holders[email] = until
+        return holders
+
+    def _current(self):
+        """Return the holder map, reloading it if it is stale; True as 2nd value on a reload."""
+        shared = self._shared()
+        generation = shared.get(GENERATION_KEY, 0) if shared is not None else None
+
+        holders = self._holders
+        if holders is not None and generation == self._generation \
+                and (shared is not None or time.monotonic() - self._loaded_at < self.ttl):
+            return holders, False
+
+        with self._lock:
+            stored = shared.get(MAP_KEY) if shared is not None else None
+            if stored is not None and stored[0] == generation:
+                holders = stored[1]
+            else:
+                holders = self._load_from_db()
+                if shared is not None:
+                    shared.set(MAP_KEY, (generation, holders), self.ttl)
+            self._holders = holders
+            self._loaded_at = time.monotonic()
+            self._generation = generation
+        return holders, True
+
+    def is_pass_holder(self, email):
+        holders, reloaded = self._current()
+        until = holders.get(normalize_email(email))
+        with self._lock:
+            if reloaded:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return until is not None and until >= timezone.localdate()
+
+    def invalidate(self):
+        with self._lock:
+            self._holders = None
+            self.invalidations += 1
+        shared = self._shared()
+        if shared is not None:
+            shared.delete(MAP_KEY)
+            try:
+                shared.incr(GENERATION_KEY)
+            except ValueError:
+                # No generation yet (or it was evicted); any new value invalidates
+                shared.set(GENERATION_KEY, time.time_ns(), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "holders": len(self._holders) if self._holders is not None else None,
+                "shared": bool(self.alias),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pass_holder_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PassHolderCache(settings.PASS_HOLDER_CACHE_TTL, settings.PASS_HOLDER_CACHE_ALIAS)
+    return _cache
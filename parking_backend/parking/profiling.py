@@ -0,0 +1,166 @@
+# profiling.py
+# Stage timings for the face verification pipeline.
+#
+# The verify-face views wrap match_face() in profiled(); inside it, the
+# pipeline (face_match, face_pool, and the face worker via its reply) marks
+# stages with stage() / record(). Outside a profiled() block both are no-ops.
+#
+# Every profile is added to a per-process sample store (the last
+# FACE_PROFILE_SAMPLES timings per stage), which is written to
+# FACE_PROFILE_DIR/<pid>.json every FACE_PROFILE_FLUSH_SECONDS; the
+# face_profile management command merges those files into percentiles.
+# Files not rewritten for FACE_PROFILE_MAX_AGE (dead or idle processes) are
+# deleted on every flush and by the command, so pids do not pile up.
+# With FACE_PROFILE_SERVER_TIMING (or an "X-Face-Profile: 1" request
+# header) the timings of the request also go back in a Server-Timing header.
+import atexit
+import contextvars
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("face_profile", default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.stages = []  # (name, ms, description)
+
+    def add(self, name, ms, description=None):
+        self.stages.append((name, ms, description))
+
+    def server_timing(self):
+        parts = []
+        for name, ms, description in self.stages:
+            part = f"{name};dur={ms:.1f}"
+            if description:
+                part += f';desc="{description}"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+@contextmanager
+def stage(name, description=None):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - started) * 1000, description)
+
+
+def record(name, ms, description=None):
+    """Add a timing measured elsewhere (e.g. inside the face worker)."""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(name, ms, description)
+
+
+@contextmanager
+def profiled():
+    """Profile the block; yields the Profile (None when FACE_PROFILING is off)."""
+    if not settings.FACE_PROFILING:
+        yield None
+        return
+    profile = Profile()
+    token = _current.set(profile)
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        profile.add("total", (time.perf_counter() - started) * 1000)
+        get_sample_store().add(profile)
+
+
+def wants_server_timing(request):
+    return settings.FACE_PROFILE_SERVER_TIMING or request.headers.get("X-Face-Profile") == "1"
+
+
+def sample_files(directory, max_age):
+    """The <pid>.json files in `directory`, deleting those not rewritten for `max_age` seconds."""
+    cutoff = time.time() - max_age
+    fresh = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+            else:
+                fresh.append(path)
+        except OSError:
+            pass  # another process removed it first
+    return fresh
+
+
+class SampleStore:
+    def __init__(self, directory, size, flush_seconds, max_age):
+        self.directory = directory
+        self.size = size
+        self.flush_seconds = flush_seconds
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._samples = {}  # stage -> deque of ms
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+    def add(self, profile):
+        with self._lock:
+            for name, ms, _ in profile.stages:
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.size)
+                samples.append(round(ms, 3))
+            self._dirty = True
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "pid": os.getpid(),
+                "updated": time.time(),
+                "samples": {name: list(samples) for name, samples in self._samples.items()},
+            }
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        # pid looked up here, not at start-up: forked workers each get their own file
+        path = os.path.join(self.directory, f"{data['pid']}.json")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.error(f"Could not write face profile samples to {path}: {str(e)}")
+        sample_files(self.directory, self.max_age)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_sample_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SampleStore(settings.FACE_PROFILE_DIR, settings.FACE_PROFILE_SAMPLES,
+                                     settings.FACE_PROFILE_FLUSH_SECONDS, settings.FACE_PROFILE_MAX_AGE)
+                atexit.register(_store.flush)
+    return _store
@@ -1,20 +1,71 @@
 # qr.py
+# Cancellation QR codes are rendered in memory and the PNG bytes are kept in
+# a small LRU keyed by the encoded payload, so repeat cancellations for a
+# spot cost a dict lookup instead of a qrcode render + a write to media/qr.
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
 import qrcode
-import os
 from django.conf import settings
 
-# qr.py
-def generate_qr(spot_id):
-    qr_dir = os.path.join(settings.MEDIA_ROOT, "qr")
-    os.makedirs(qr_dir, exist_ok=True)
-    
-    file_name = f"cancel_{spot_id}.png"
-    file_path = os.path.join(qr_dir, file_name)
-
-    # Typo fixed (42S -> 42) and URL aligned with urls.py
-    # Unga main urls.py-la 'api/' prefix iruntha ithu correct
-    api_link = f"http://10.154.53.42:8000/api/mark_as_scanned/{spot_id}/"
-    
-    qr = qrcode.make(api_link)
-    qr.save(file_path)
-    return f"media/qr/{file_name}"
\ No newline at end of file
+
+class PngCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+_cache = None
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = PngCache(settings.QR_CACHE_SIZE)
+    return _cache
+
+
+def scan_url(spot_id):
+    # The phone scanning the QR hits mark_as_scanned on this server
+    return f"{settings.QR_SCAN_BASE_URL.rstrip('/')}/api/mark_as_scanned/{spot_id}/"
+
+
+def render_qr_png(payload):
+    """Return (png_bytes, etag) for a payload, rendering it only on a cache miss."""
+    cache = _get_cache()
+    item = cache.get(payload)
+    if item is None:
+        buffer = io.BytesIO()
+        qrcode.make(payload).save(buffer)
+        png = buffer.getvalue()
+        item = (png, f'"{hashlib.sha1(png).hexdigest()}"')
+        cache.put(payload, item)
+    return item
+
+
+def qr_data_uri(spot_id):
+    png, _ = render_qr_png(scan_url(spot_id))
+    return "data:image/png;base64," + base64.b64encode(png).decode()
+
+
+def qr_path(spot_id):
+    # Relative to the server root, like the old media/qr/... paths
+    return f"api/qr/{spot_id}/"
@@ -0,0 +1,51 @@
+# renderers.py
+# Fast JSON output for the hot endpoints. orjson is used when it is
+# installed (it encodes straight to bytes, several times faster than the
+# stdlib encoder DRF's JSONRenderer wraps); without it we fall back to a
+# compact stdlib dump. Selected through REST_FRAMEWORK in settings, together
+# with the lean serializers, by FAST_SERIALIZATION.
+import json
+
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_fallback_encoder = JSONEncoder()
+
+
+def dumps(data):
+    if orjson is not None:
+        # Anything orjson does not know natively (lazy strings, Decimal, ...) goes through DRF's encoder
+        return orjson.dumps(data, default=_fallback_encoder.default)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+def json_response(data, status=200):
+    """A JsonResponse equivalent that encodes with dumps()."""
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+# check_scan_status / wait_scan_status answer one of two bodies thousands of
+# times a minute; encode them once
+SCANNED_BODY = dumps({"is_scanned": True})
+NOT_SCANNED_BODY = dumps({"is_scanned": False})
+
+
+def scan_status_response(is_scanned):
+    return HttpResponse(SCANNED_BODY if is_scanned else NOT_SCANNED_BODY, content_type='application/json')
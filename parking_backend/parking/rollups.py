@@ -0,0 +1,95 @@
+# rollups.py
+# Hourly occupancy rollups per branch + spot type (OccupancyRollup).
+#
+# A new reservation adds its booked minutes to every hour its window
+# touches and counts as a booking in its first hour. A cancellation takes
+# back only the minutes that had not happened yet and counts as a
+# cancellation; a reservation deleted after its window ended (e.g. by
+# sweep_reservations) changes nothing, because that time was used.
+# Windows are the same as everywhere else (parking.intervals): start/end
+# on the local date of created_at, rolling past midnight.
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .intervals import window_for
+from .models import OccupancyRollup
+
+HOUR = timedelta(hours=1)
+
+
+def hour_slices(start, end):
+    """Yield (hour_start, minutes) for each clock hour that [start, end) overlaps."""
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        overlap = min(end, hour + HOUR) - max(start, hour)
+        if overlap > timedelta(0):
+            yield hour, overlap.total_seconds() / 60
+        hour += HOUR
+
+
+def capacity_units(spot_type):
+    conf = settings.PARKING_LAYOUT.get(spot_type)
+    return len(conf["spots"]) * conf["capacity"] if conf else 0
+
+
+def _bump(branch, spot_type, hour, **deltas):
+    key = dict(branch=branch, spot_type=spot_type, hour_start=timezone.make_aware(hour))
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if OccupancyRollup.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            OccupancyRollup.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Another request created the row first
+        OccupancyRollup.objects.filter(**key).update(**changes)
+
+
+def record_created(*reservations):
+    # Sum the deltas first, so a bulk insert costs one update per touched hour
+    deltas = {}
+    for reservation in reservations:
+        start, end = window_for(reservation)
+        for i, (hour, minutes) in enumerate(hour_slices(start, end)):
+            row = deltas.setdefault((reservation.branch, reservation.spot_type, hour),
+                                    {"reservations": 0, "occupied_minutes": 0.0})
+            row["occupied_minutes"] += minutes
+            if i == 0:
+                row["reservations"] += 1
+
+    with transaction.atomic():
+        for (branch, spot_type, hour), row in deltas.items():
+            _bump(branch, spot_type, hour, **row)
+
+
+def record_cancelled(reservation):
+    start, end = window_for(reservation)
+    now = timezone.localtime().replace(tzinfo=None)
+    if end <= now:
+        return  # already over: the time was used, keep it
+    with transaction.atomic():
+        _bump(reservation.branch, reservation.spot_type, start.replace(minute=0, second=0, microsecond=0),
+              cancellations=1)
+        for hour, minutes in hour_slices(max(start, now), end):
+            _bump(reservation.branch, reservation.spot_type, hour, occupied_minutes=-minutes)
+
+
+def utilization(branch, spot_type, start, end):
+    """Rollup rows for [start, end) (naive local datetimes) with utilization per hour."""
+    units = capacity_units(spot_type)
+    rows = (OccupancyRollup.objects
+            .filter(branch=branch, spot_type=spot_type,
+                    hour_start__gte=timezone.make_aware(start), hour_start__lt=timezone.make_aware(end))
+            .order_by('hour_start')
+            .values('hour_start', 'reservations', 'cancellations', 'occupied_minutes'))
+    return [{
+        "hour": timezone.localtime(row['hour_start']).isoformat(),
+        "reservations": row['reservations'],
+        "cancellations": row['cancellations'],
+        "occupied_minutes": round(row['occupied_minutes'], 1),
+        "utilization": round(row['occupied_minutes'] / (60 * units), 4) if units else None,
+    } for row in rows]
@@ -0,0 +1,113 @@
+# scan_events.py
+# In-process pub/sub for QR cancellation scans, keyed by spot. The
+# mark_as_scanned view publishes; the SSE stream and the long-poll endpoint
+# (parking.async_views) wait on it instead of polling the database. Waiters
+# always re-check the database after a wake-up or timeout, so a scan handled
+# by another server process is still picked up, just not instantly.
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Subquery
+
+from .allocator import lock_spot
+from .models import Reservation
+
+
+class Subscription:
+    def __init__(self, hub, spot_id):
+        self.hub = hub
+        self.spot_id = str(spot_id)
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        """Wait for a scan on this spot; returns True if one was published."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def __enter__(self):
+        self.hub._add(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.hub._remove(self)
+
+
+class ScanEventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, spot_id):
+        return Subscription(self, spot_id)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscribers[subscription.spot_id].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            waiting = self._subscribers.get(subscription.spot_id)
+            if waiting is not None:
+                waiting.discard(subscription)
+                if not waiting:
+                    del self._subscribers[subscription.spot_id]
+
+    def publish(self, spot_id):
+        # Called from sync views (any thread); wake each waiter on its own loop
+        with self._lock:
+            waiting = list(self._subscribers.get(str(spot_id), ()))
+        for subscription in waiting:
+            subscription.loop.call_soon_threadsafe(subscription.event.set)
+
+    def waiting(self, spot_id):
+        with self._lock:
+            return len(self._subscribers.get(str(spot_id), ()))
+
+
+scan_hub = ScanEventHub()
+
+
+# Both transitions are conditional on the row's state (the row is picked by
+# a subquery on reservation_spot_scan_idx), so a phone double-scan or two tabs
+# polling at once can never apply the same transition twice. mark_scanned is
+# a single UPDATE. A delete is not: with post_delete receivers Django selects
+# the row, deletes it by pk and then sends the signal for every row it
+# selected, even when a concurrent poller's DELETE got there first. So
+# delete_reservation() takes the spot's lock row before that SELECT.
+
+def delete_reservation(pk, branch, spot_id, **conditions):
+    """Delete reservation pk if it still matches conditions; True when this call deleted it."""
+    with transaction.atomic():
+        # A write first, as in create_reservation: SQLite hands out its write lock
+        # before the collector's SELECT (a read upgraded to a write fails at once
+        # with "database is locked"), and a second delete of the same row waits
+        # here, then selects nothing - so its post_delete receivers never run
+        lock_spot(branch, spot_id)
+        deleted, _ = Reservation.objects.filter(pk=pk, **conditions).delete()
+        if not deleted:
+            # Deleted in between by a path without the lock (admin): undo the receivers' rollup writes
+            transaction.set_rollback(True)
+    return deleted > 0
+
+
+def mark_scanned(spot_id):
+    """Flag the latest unscanned reservation for this spot; True when a row changed."""
+    latest = (Reservation.objects.filter(spot_id=spot_id, is_scanned=False)
+              .order_by('-created_at', '-pk').values('pk')[:1])
+    return Reservation.objects.filter(pk=Subquery(latest), is_scanned=False).update(is_scanned=True) > 0
+
+
+def consume_scan(spot_id):
+    """Delete the scanned reservation for this spot, if any; True when one was deleted."""
+    oldest = (Reservation.objects.filter(spot_id=spot_id, is_scanned=True)
+              .order_by('created_at', 'pk').values('pk', 'branch').first())
+    if oldest is None:
+        return False
+    return delete_reservation(oldest['pk'], oldest['branch'], spot_id, is_scanned=True)
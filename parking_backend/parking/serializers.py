@@ -1,19 +1,27 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Reservation, MonthlyPass, YearlyPass,Employee
+from .models import Reservation, MonthlyPass, YearlyPass,Employee, normalize_email
 
-class ReservationSerializer(serializers.ModelSerializer):
+
+class NormalizedEmailMixin:
+    def validate_email(self, value):
+        return normalize_email(value)
+
+
+class ReservationSerializer(NormalizedEmailMixin, serializers.ModelSerializer):
     class Meta:
         model = Reservation
         fields = "__all__"
 
 
-class MonthlyPassSerializer(serializers.ModelSerializer):
+class MonthlyPassSerializer(NormalizedEmailMixin, serializers.ModelSerializer):
     class Meta:
         model = MonthlyPass
         fields = "__all__"
 
 
-class YearlyPassSerializer(serializers.ModelSerializer):
+class YearlyPassSerializer(NormalizedEmailMixin, serializers.ModelSerializer):
     class Meta:
         model = YearlyPass
         fields = "__all__"
@@ -23,3 +31,63 @@ class EmployeeSerializer(serializers.ModelSerializer):
         model = Employee
         fields = "__all__"
 
+
+
+# -----------------------------
+# LEAN READ SERIALIZERS (hot responses)
+# -----------------------------
+# A ModelSerializer builds and walks its field objects for every instance it
+# renders. For the few responses sent at kiosk / gate rates the field list
+# and a converter per field are worked out once, here, from the model;
+# output matches DRF's default formats (ISO dates, "Z" for UTC).
+def _iso_datetime(value):
+    value = timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _iso(value):
+    return value.isoformat()
+
+
+def _file_url(value):
+    return value.url if value else None
+
+
+_CONVERTERS = {
+    'DateTimeField': _iso_datetime,
+    'DateField': _iso,
+    'TimeField': _iso,
+    'FloatField': float,
+    'ImageField': _file_url,
+    'FileField': _file_url,
+}
+
+
+class LeanSerializer:
+    def __init__(self, model, fields):
+        self.fields = []
+        for name in fields:
+            field = model._meta.get_field(name)
+            self.fields.append((name, field.attname, _CONVERTERS.get(field.get_internal_type())))
+
+    def dump(self, instance):
+        data = {}
+        for name, attname, convert in self.fields:
+            value = getattr(instance, attname)
+            data[name] = convert(value) if convert is not None and value is not None else value
+        return data
+
+
+# Face match: who it is, without the photo URL, phone or age
+EMPLOYEE_MATCH = LeanSerializer(Employee, ('id', 'name', 'email', 'employee_id', 'vehicle_number'))
+
+# reserve/ response: same fields as ReservationSerializer
+RESERVATION_CREATED = LeanSerializer(Reservation, [f.name for f in Reservation._meta.concrete_fields])
+
+
+def employee_match_data(employee):
+    return EMPLOYEE_MATCH.dump(employee) if settings.FAST_SERIALIZATION else EmployeeSerializer(employee).data
+
+
+def reservation_created_data(serializer):
+    return RESERVATION_CREATED.dump(serializer.instance) if settings.FAST_SERIALIZATION else serializer.data
@@ -0,0 +1,139 @@
+# signals.py
+# Keeps the face subsystem's Employee pk mappings (embedding index + ORB
+# descriptor store) in step with Employee saves and deletes, and keeps the
+# spot allocator, the reservation interval index and the hourly occupancy
+# rollups in step with Reservation saves and deletes, and the gate entitlement index and the
+# pass-holder cache in step with pass saves and deletes.
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Employee, MonthlyPass, Reservation, YearlyPass
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Employee)
+def remember_previous_face(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Employee.objects.filter(pk=instance.pk).values_list('profile_pic', flat=True).first()
+    instance._previous_profile_pic = previous or ""
+
+
+@receiver(post_save, sender=Employee)
+def refresh_face_mappings(sender, instance, **kwargs):
+    from .face_index import in_background
+
+    current = instance.profile_pic.name if instance.profile_pic else ""
+    if current == getattr(instance, '_previous_profile_pic', ""):
+        return
+    pk = instance.pk
+    # After the commit and off the request: embedding the photo can wait on a face worker start-up
+    transaction.on_commit(lambda: in_background(_refresh_employee_faces, pk))
+
+
+@receiver(post_delete, sender=Employee)
+def drop_face_mappings(sender, instance, **kwargs):
+    from .face_index import in_background
+
+    pk = instance.pk
+    transaction.on_commit(lambda: in_background(_drop_employee_faces, pk))
+
+
+def _refresh_employee_faces(pk):
+    from .face_index import index_employee
+    from .orb_store import get_orb_store
+
+    # Read back now: a later save may have changed the photo again (its own job follows this one)
+    employee = Employee.objects.filter(pk=pk).first()
+    if employee is None:
+        return  # deleted meanwhile; _drop_employee_faces is queued
+    if not employee.profile_pic:
+        # Photo removed: the employee can no longer be matched
+        _drop_employee_faces(pk)
+        return
+
+    if not index_employee(employee):
+        logger.error(f"Employee {pk} saved but could not be added to the face index")
+    get_orb_store().add_file(pk, employee.profile_pic.path)
+
+
+def _drop_employee_faces(pk):
+    from .face_index import get_face_index
+    from .orb_store import get_orb_store
+
+    get_face_index().remove(pk)
+    get_orb_store().remove_employee(pk)
+
+
+@receiver(post_save, sender=Reservation)
+def track_reservation_window(sender, instance, **kwargs):
+    from .allocator import get_allocator
+    from .intervals import get_interval_index
+
+    def track():
+        get_interval_index().track(instance)
+        get_allocator().recount(instance.branch, instance.spot_id)
+    # After commit: a save that is rolled back must not leave a window behind
+    transaction.on_commit(track)
+
+
+@receiver(post_save, sender=Reservation)
+def add_to_rollups(sender, instance, created, **kwargs):
+    from .rollups import record_created
+
+    if not created:
+        return
+    try:
+        record_created(instance)
+    except Exception as e:
+        # Drift is repaired by the rebuild_rollups command
+        logger.error(f"Could not add reservation {instance.pk} to the occupancy rollups: {str(e)}")
+
+
+@receiver(post_delete, sender=Reservation)
+def release_reserved_spot(sender, instance, **kwargs):
+    from .allocator import get_allocator
+    from .intervals import get_interval_index
+
+    get_allocator().recount(instance.branch, instance.spot_id)
+    get_interval_index().forget(instance)
+
+
+@receiver(post_delete, sender=Reservation)
+def remove_from_rollups(sender, instance, **kwargs):
+    from .rollups import record_cancelled
+
+    try:
+        record_cancelled(instance)
+    except Exception as e:
+        logger.error(f"Could not take reservation {instance.pk} out of the occupancy rollups: {str(e)}")
+
+
+PASS_TYPES = {MonthlyPass: "monthly", YearlyPass: "yearly"}
+
+
+@receiver(post_save, sender=MonthlyPass)
+@receiver(post_save, sender=YearlyPass)
+def track_pass_entitlement(sender, instance, **kwargs):
+    from .entitlements import get_entitlement_index
+    from .pass_holders import get_pass_holder_cache
+
+    # After the commit: a rolled-back save must not open the gate, and a
+    # reload in between would otherwise read (and keep) the old rows
+    transaction.on_commit(lambda: get_entitlement_index().upsert(PASS_TYPES[sender], instance))
+    transaction.on_commit(get_pass_holder_cache().invalidate)
+
+
+@receiver(post_delete, sender=MonthlyPass)
+@receiver(post_delete, sender=YearlyPass)
+def drop_pass_entitlement(sender, instance, **kwargs):
+    from .entitlements import get_entitlement_index
+    from .pass_holders import get_pass_holder_cache
+
+    pk = instance.pk  # cleared on the instance once the delete is done
+    transaction.on_commit(lambda: get_entitlement_index().remove(PASS_TYPES[sender], pk))
+    transaction.on_commit(get_pass_holder_cache().invalidate)
@@ -0,0 +1,472 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, pre_delete
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import allocator, face_index, intervals, metrics, pass_holders
+from .allocator import SpotUnavailable, get_allocator
+from .async_views import VerifyQueue
+from .intervals import get_interval_index
+from .models import Employee, MonthlyPass, OccupancyRollup, Reservation, ReservationArchive, SpotLock
+from .pass_holders import MAP_KEY, PassHolderCache, get_pass_holder_cache
+from .scan_events import consume_scan
+
+
+def reservation_payload(start, end, **extra):
+    payload = {"branch": "main", "spot_id": "1", "spot_type": "car", "name": "Priya",
+               "email": "priya@example.com", "password": "secret",
+               "start_time": start, "end_time": end, "duration_hours": 1}
+    payload.update(extra)
+    return payload
+
+
+class FreshSingletonsMixin:
+    # The allocator and interval index are per process; start every test without them
+    def setUp(self):
+        super().setUp()
+        allocator._allocator = None
+        intervals._index = None
+
+    def reserve(self, start, end, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/reserve/", reservation_payload(start, end, **extra),
+                                    content_type="application/json")
+
+
+@override_settings(PARKING_BRANCHES=["", "main"])
+class ReservationWindowTests(FreshSingletonsMixin, TestCase):
+    def test_advertised_free_window_can_be_booked(self):
+        self.assertEqual(self.reserve("09:00", "10:00").status_code, 201)
+
+        windows = self.client.get("/api/spots/1/free-windows/", {"branch": "main"}).json()["free_windows"]
+        self.assertIn("10:00:00", windows[-1]["start"])
+
+        self.assertEqual(self.reserve("11:00", "12:00").status_code, 201)
+
+    def test_overlapping_window_is_rejected(self):
+        self.assertEqual(self.reserve("09:00", "10:00").status_code, 201)
+        response = self.reserve("09:30", "10:30")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Reservation.objects.filter(spot_id="1").count(), 1)
+
+    def test_bulk_items_conflict_with_each_other(self):
+        items = [reservation_payload("09:00", "10:00"), reservation_payload("09:30", "10:30"),
+                 reservation_payload("10:00", "11:00")]
+        response = self.client.post("/api/reserve/bulk/", items, content_type="application/json")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r["ok"] for r in response.json()["results"]], [True, False, True])
+
+    def test_hold_is_the_clients_own(self):
+        spot = self.client.post("/api/spots/allocate/", {"branch": "main", "spot_type": "car"},
+                                content_type="application/json").json()
+        now = timezone.localtime()
+        start = now.strftime("%H:%M")
+        end = (now + timedelta(minutes=30)).strftime("%H:%M")
+
+        # Someone else cannot take the held spot right now...
+        self.assertEqual(self.reserve(start, end, spot_id=spot["spot_id"]).status_code, 409)
+        # ...the holder can
+        response = self.reserve(start, end, spot_id=spot["spot_id"], hold=spot["hold"], email="holder@example.com")
+        self.assertEqual(response.status_code, 201)
+
+    def test_spots_outside_the_layout_are_rejected(self):
+        self.assertEqual(self.reserve("09:00", "10:00", spot_id="9").status_code, 400)  # a bike spot
+        self.assertEqual(self.reserve("09:00", "10:00", branch="nowhere").status_code, 400)
+        self.assertEqual(self.reserve("09:00", "10:00", spot_id="99").status_code, 400)
+
+        items = [reservation_payload("09:00", "10:00"), reservation_payload("09:00", "10:00", spot_id="9"),
+                 reservation_payload("09:00", "10:00", branch="nowhere")]
+        response = self.client.post("/api/reserve/bulk/", items, content_type="application/json")
+        self.assertEqual([r["ok"] for r in response.json()["results"]], [True, False, False])
+
+        self.assertEqual(self.client.get("/api/spots/", {"branch": "nowhere"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/spots/allocate/", {"branch": "nowhere", "spot_type": "car"},
+                                          content_type="application/json").status_code, 400)
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertFalse(SpotLock.objects.filter(branch="nowhere").exists())
+        self.assertEqual({branch for branch, _ in get_allocator()._pools}, {"main"})
+
+
+@override_settings(PARKING_BRANCHES=["", "main"])
+class OtherProcessTests(FreshSingletonsMixin, TestCase):
+    """Rows written by another server process: saved without this process's signals."""
+
+    def other_process_books(self, start, end):
+        Reservation.objects.bulk_create([Reservation(**{
+            **reservation_payload(start, end), "start_time": start, "end_time": end})])
+
+    def test_claim_sees_bookings_from_other_processes(self):
+        get_interval_index().free_windows("main", "1", datetime.now(), datetime.now() + timedelta(days=1))
+        self.other_process_books(time(9), time(10))
+
+        day = timezone.localdate()
+        with self.assertRaises(SpotUnavailable):
+            get_allocator().claim("main", "1", datetime.combine(day, time(9, 30)), datetime.combine(day, time(10, 30)))
+        self.assertEqual(self.reserve("09:30", "10:30").status_code, 409)
+
+    @override_settings(INTERVAL_INDEX_MAX_AGE=0)
+    def test_free_windows_reconcile_with_other_processes(self):
+        index = get_interval_index()
+        start = datetime.combine(timezone.localdate(), time.min)
+        self.assertEqual(len(index.free_windows("main", "1", start, start + timedelta(days=1))), 1)
+
+        self.other_process_books(time(9), time(10))
+        windows = index.free_windows("main", "1", start, start + timedelta(days=1))
+        self.assertEqual([(s.time(), e.time()) for s, e in windows], [(time.min, time(9)), (time(10), time.min)])
+
+    def test_free_windows_load_only_the_days_asked_for(self):
+        self.other_process_books(time(9), time(10))
+        Reservation.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.other_process_books(time(11), time(12))
+
+        index = get_interval_index()
+        start = datetime.combine(timezone.localdate(), time.min)
+        windows = index.free_windows("main", "1", start, start + timedelta(days=1))
+        self.assertEqual([(s.time(), e.time()) for s, e in windows], [(time.min, time(11)), (time(12), time.min)])
+        self.assertEqual(len(index._spots[("main", "1")].entries), 1)
+
+        # An older day widens the cached range instead of evicting today
+        old = start - timedelta(days=30)
+        windows = index.free_windows("main", "1", old, old + timedelta(days=1))
+        self.assertEqual([(s.time(), e.time()) for s, e in windows], [(time.min, time(9)), (time(10), time.min)])
+        self.assertEqual(len(index._spots[("main", "1")].entries), 2)
+
+
+class ListAuthTests(TestCase):
+    urls = ["/api/reservations/", "/api/monthly-passes/", "/api/yearly-passes/", "/api/employees/"]
+
+    def test_lists_need_staff(self):
+        for url in self.urls:
+            self.assertIn(self.client.get(url).status_code, (401, 403), url)
+
+        self.client.force_login(User.objects.create_user("guard", password="secret"))
+        for url in self.urls:
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+
+    def test_staff_can_list(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret", is_staff=True))
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(json.loads(b"".join(response.streaming_content))["results"], [])
+
+    def test_cursor_pages_cover_every_row_once(self):
+        for i in range(5):
+            Reservation.objects.create(**reservation_payload(time(9), time(10), email=f"p{i}@example.com"))
+        # Ties on created_at are broken by id
+        Reservation.objects.filter(pk__in=Reservation.objects.order_by("pk").values("pk")[1:4]).update(
+            created_at=Reservation.objects.order_by("pk")[1].created_at)
+
+        self.client.force_login(User.objects.create_user("admin", password="secret", is_staff=True))
+        seen, params = [], {"limit": 2, "branch": "main", "fields": "id"}
+        while True:
+            page = json.loads(b"".join(self.client.get("/api/reservations/", params).streaming_content))
+            seen += [row["id"] for row in page["results"]]
+            if not page["next"]:
+                break
+            params["cursor"] = page["next"]
+        self.assertEqual(seen, list(Reservation.objects.order_by("created_at", "id").values_list("id", flat=True)))
+
+
+@override_settings(PASS_HOLDER_CACHE_ALIAS="default")
+class SharedPassHolderCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pass_holders._cache = None
+
+    def test_map_loaded_before_an_invalidation_is_not_reused(self):
+        # Another worker process loads while this one saves (and invalidates)
+        worker, other_worker = PassHolderCache(300, "default"), get_pass_holder_cache()
+        load = worker._load_from_db
+
+        def slow_load():
+            holders = load()
+            # A pass is bought while this worker is still reading the old rows
+            with self.captureOnCommitCallbacks(execute=True):
+                MonthlyPass.objects.create(
+                    name="Priya", email="priya@example.com", age=30, vehicle_number="TN01AB1234",
+                    start_time=time(6), end_time=time(22), start_date=timezone.localdate(),
+                    end_date=timezone.localdate() + timedelta(days=30))
+            return holders
+
+        worker._load_from_db = slow_load
+        self.assertFalse(worker.is_pass_holder("priya@example.com"))
+        self.assertTrue(other_worker.is_pass_holder("priya@example.com"))
+        self.assertTrue(worker.is_pass_holder("priya@example.com"))
+
+    def test_invalidation_waits_for_the_commit(self):
+        self.assertFalse(get_pass_holder_cache().is_pass_holder("priya@example.com"))
+        with self.captureOnCommitCallbacks(execute=True):
+            MonthlyPass.objects.create(
+                name="Priya", email="priya@example.com", age=30, vehicle_number="TN01AB1234",
+                start_time=time(6), end_time=time(22), start_date=timezone.localdate(),
+                end_date=timezone.localdate())
+            self.assertIsNotNone(cache.get(MAP_KEY))
+        self.assertIsNone(cache.get(MAP_KEY))
+
+
+class GateCheckTests(TestCase):
+    def check(self, body):
+        return self.client.post("/api/gate/check/", body, content_type="application/json")
+
+    def test_bad_plates_are_rejected(self):
+        response = self.check({"vehicle_numbers": ["TN01AB1234", 5, None, " "]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["invalid_indexes"], [1, 2, 3])
+        self.assertEqual(self.check({"vehicle_number": 5}).status_code, 400)
+
+    def test_unknown_plate_is_not_allowed(self):
+        response = self.check({"vehicle_numbers": ["tn 01-ab 1234"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["results"][0]["allowed"])
+
+
+class SweepReservationsTests(TestCase):
+    def book(self, days_ago, start, end, **extra):
+        res = Reservation.objects.create(**reservation_payload(start, end, **extra))
+        Reservation.objects.filter(pk=res.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return res.pk
+
+    def test_sweep_moves_only_rows_that_are_over(self):
+        over = self.book(3, time(9), time(10))
+        live = self.book(0, time(9), time(8, 59), email="overnight@example.com")  # ends tomorrow
+        self.book(-2, time(9), time(10), email="clock@example.com")  # past the horizon: never read
+
+        deleted = mock.Mock()
+        post_delete.connect(deleted, sender=Reservation)
+        self.addCleanup(post_delete.disconnect, deleted, sender=Reservation)
+        out = StringIO()
+        call_command("sweep_reservations", pause=0, stdout=out)
+
+        self.assertIn("Archived 1 of 2 reservations", out.getvalue())
+        self.assertEqual(list(ReservationArchive.objects.values_list("original_id", flat=True)), [over])
+        self.assertTrue(Reservation.objects.filter(pk=live).exists())
+        self.assertFalse(Reservation.objects.filter(pk=over).exists())
+        deleted.assert_not_called()
+
+
+class MetricsShardTests(TestCase):
+    def test_exited_threads_are_folded_into_one_shard(self):
+        before = metrics._collect()[0].get(("parking_test_total", ()), 0)
+        for _ in range(5):
+            thread = threading.Thread(target=metrics.inc, args=("parking_test_total",))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(metrics._collect()[0][("parking_test_total", ())], before + 5)
+        self.assertFalse([thread for thread, _ in metrics._shards if not thread.is_alive()])
+
+
+class FaceProfileTests(TestCase):
+    def test_stale_process_files_are_dropped(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for pid, age in ((101, 0), (102, 2 * 86400)):
+            path = os.path.join(directory.name, f"{pid}.json")
+            with open(path, "w") as f:
+                json.dump({"pid": pid, "samples": {"worker_detect": [5.0], "worker_embed": [20.0]}}, f)
+            os.utime(path, (timezone.now().timestamp() - age,) * 2)
+
+        out = StringIO()
+        with override_settings(FACE_PROFILE_DIR=directory.name, FACE_PROFILE_MAX_AGE=86400):
+            call_command("face_profile", "--json", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["processes"], 1)
+        self.assertEqual(report["stages"]["worker_embed"]["count"], 1)
+        self.assertEqual(os.listdir(directory.name), ["101.json"])
+
+
+class VerifyQueueTests(TestCase):
+    def test_cancelled_request_keeps_its_slot_until_the_job_ends(self):
+        queue = VerifyQueue(workers=1, capacity=1)
+        self.addCleanup(queue.executor.shutdown)
+        running, release = threading.Event(), threading.Event()
+
+        def job():
+            running.set()
+            release.wait(5)
+            return 0.25, None, None
+
+        async def request():
+            await asyncio.wrap_future(queue.submit(job))
+
+        async def client_goes_away():
+            task = asyncio.ensure_future(request())
+            await asyncio.get_running_loop().run_in_executor(None, running.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        queue.try_enter()
+        asyncio.run(client_goes_away())
+        self.assertIsNone(queue.try_enter())  # the job still runs
+
+        release.set()
+        queue.executor.shutdown(wait=True)
+        self.assertEqual(queue.stats()["in_flight"], 0)
+        self.assertEqual(queue.stats()["max_wait_ms"], 250.0)
+
+
+class ConsumeScanTests(TestCase):
+    def setUp(self):
+        now = timezone.localtime()
+        self.reservation = Reservation.objects.create(**{
+            **reservation_payload(now.time(), (now + timedelta(hours=2)).time()), "is_scanned": True})
+
+    def cancellations(self):
+        return OccupancyRollup.objects.aggregate(n=Sum("cancellations"))["n"] or 0
+
+    def test_scan_cancels_once(self):
+        self.assertTrue(consume_scan("1"))
+        self.assertFalse(consume_scan("1"))
+        self.assertEqual(self.cancellations(), 1)
+
+    def test_concurrent_poller_is_not_counted_twice(self):
+        def other_poller(sender, instance, **kwargs):
+            # The row is gone between this poller's SELECT and its DELETE
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {Reservation._meta.db_table} WHERE id = %s", [instance.pk])
+
+        pre_delete.connect(other_poller, sender=Reservation)
+        try:
+            self.assertFalse(consume_scan("1"))
+        finally:
+            pre_delete.disconnect(other_poller, sender=Reservation)
+        self.assertEqual(self.cancellations(), 0)
+
+
+class ConcurrentConsumeScanTests(TransactionTestCase):
+    def test_racing_pollers_delete_once_without_lock_errors(self):
+        now = timezone.localtime()
+        Reservation.objects.create(**{
+            **reservation_payload(now.time(), (now + timedelta(hours=2)).time()), "is_scanned": True})
+        for i in range(5):
+            Reservation.objects.create(**reservation_payload(time(9), time(10), email=f"other{i}@example.com"))
+
+        start, results = threading.Barrier(12), []
+
+        def poll():
+            try:
+                start.wait()
+                results.append(consume_scan("1"))
+            except Exception as e:
+                results.append(e)
+            finally:
+                connections.close_all()
+
+        def read():
+            # Status checks of the same spot, reading while the pollers write
+            try:
+                start.wait()
+                for _ in range(20):
+                    list(Reservation.objects.filter(spot_id="1").values("pk", "is_scanned"))
+            except Exception as e:
+                results.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=poll if i % 2 else read) for i in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([r for r in results if isinstance(r, Exception)], [])
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(OccupancyRollup.objects.aggregate(n=Sum("cancellations"))["n"], 1)
+
+
+@override_settings(SCAN_LONG_POLL_SECONDS=0)
+class ScanPushTransportTests(TestCase):
+    def test_push_routes_refuse_wsgi(self):
+        for url in ("/api/scan_status_stream/1/", "/api/wait_scan_status/1/"):
+            self.assertEqual(self.client.get(url).status_code, 501, url)
+
+    async def test_long_poll_over_asgi(self):
+        response = await self.async_client.get("/api/wait_scan_status/1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {"is_scanned": False})
+
+
+class FaceIndexBackfillTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = override_settings(FACE_INDEX_DIR=directory.name + "/index", MEDIA_ROOT=directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        face_index._index = None
+        self.addCleanup(setattr, face_index, "_index", None)
+        # Employees from before the upgrade: saved without the indexing signal
+        Employee.objects.bulk_create([
+            Employee(name=f"E{i}", email=f"e{i}@example.com", phone="9876543210", employee_id=f"E{i}", age=30,
+                     vehicle_number=f"TN0{i}", profile_pic=f"employee_faces/e{i}.jpg") for i in range(3)])
+
+    def test_backfill_adds_missing_employees_only(self):
+        first, *rest = Employee.objects.order_by("pk")
+        face_index.get_face_index().upsert(first.pk, [1.0, 0.0])
+        with mock.patch.object(face_index, "embed_image", return_value=[0.0, 1.0]) as embed:
+            self.assertEqual(face_index.backfill(), 2)
+        self.assertEqual(embed.call_count, 2)
+        self.assertEqual(sorted(face_index.get_face_index().ids().tolist()), [first.pk] + [e.pk for e in rest])
+        self.assertEqual(face_index.get_face_index().search([1.0, 0.0], 0.9)[0], first.pk)
+
+    @override_settings(FACE_INDEX_BACKFILL_RETRY_SECONDS=300)
+    def test_backfill_is_not_retried_at_once(self):
+        face_index._backfill_started_at = None
+        self.addCleanup(setattr, face_index, "_backfill_started_at", None)
+        with mock.patch.object(face_index, "backfill", return_value=0) as backfill:
+            self.assertTrue(face_index.start_backfill())
+            face_index.in_background(lambda: None).result()
+            self.assertFalse(face_index.start_backfill())
+        backfill.assert_called_once()
+
+    def test_empty_index_is_reported_and_backfilled(self):
+        from .face_match import match_face
+
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "employee_faces"))
+        with mock.patch("parking.face_match.start_backfill") as start, \
+                mock.patch("parking.face_match.backfill_running", return_value=True):
+            body, status = match_face(b"not an image", "probe.jpg")
+        start.assert_called_once()
+        self.assertEqual((status, body.get("face_index")), (401, "building"))
+
+
+class EmployeeFaceSignalTests(TransactionTestCase):
+    def test_indexing_runs_after_commit_in_the_background(self):
+        with mock.patch("parking.face_index.index_employee", return_value=True) as index, \
+                mock.patch("parking.orb_store.OrbStore.add_file"):
+            with transaction.atomic():
+                employee = Employee.objects.create(name="E", email="e@example.com", phone="9876543210",
+                                                   employee_id="E1", age=30, vehicle_number="TN01",
+                                                   profile_pic="employee_faces/e.jpg")
+                face_index.in_background(lambda: None).result()
+                index.assert_not_called()
+            face_index.in_background(lambda: None).result()
+        self.assertEqual(index.call_args[0][0].pk, employee.pk)
+
+
+class FaceWorkerBackoffTests(TestCase):
+    def test_failed_start_is_not_retried_on_every_job(self):
+        from .face_pool import FaceWorkerPool
+
+        pool = FaceWorkerPool(1, "/nonexistent/python", job_timeout=1, startup_timeout=1, respawn_backoff=60)
+        with mock.patch("parking.face_pool.FaceWorker", side_effect=OSError("no such file")) as spawn:
+            first, second = pool.run({"op": "embed"}), pool.run({"op": "embed"})
+        self.assertEqual(spawn.call_count, 1)
+        self.assertEqual((first.status, second.status), ("error", "error"))
+        self.assertIn("next try in", second.error)
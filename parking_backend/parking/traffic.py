@@ -0,0 +1,208 @@
+# traffic.py
+# Opt-in capture of real API traffic, for replay_traffic load tests.
+#
+# With TRAFFIC_CAPTURE on, TrafficCaptureMiddleware writes one JSON line per
+# API request: arrival time, method, route, path, status, latency and the
+# *shape* of the query string and body. Values are replaced by a kind
+# ("email", "str:12", "digits:10", "date", ...) so no names, emails, phones,
+# plates or passwords reach the file; only fields listed in
+# TRAFFIC_CAPTURE_KEEP_FIELDS (branch, spot, times...) keep their value.
+# Uploaded files keep only their size and content type.
+#
+# Lines go through a queue to a background thread that writes
+# TRAFFIC_CAPTURE_DIR/capture-<pid>.jsonl, rotated at TRAFFIC_CAPTURE_MAX_BYTES
+# with TRAFFIC_CAPTURE_BACKUPS old files kept. synthesize() turns a recorded
+# shape back into a payload for the replay.
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from datetime import date
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TIME = re.compile(r"^\d{2}:\d{2}(:\d{2}(\.\d+)?)?$")
+
+
+# -----------------------------
+# Shapes
+# -----------------------------
+def _string_kind(value):
+    if "@" in value:
+        return "email"
+    if _DATE.match(value):
+        return "date"
+    if _TIME.match(value):
+        return "time"
+    if value.isdigit():
+        return f"digits:{len(value)}"
+    return f"str:{len(value)}"
+
+
+def shape(value, keep=(), name=None):
+    """The value with everything but its structure and kind stripped (fields in keep are left as they are)."""
+    if name in keep and (value is None or isinstance(value, (str, int, float, bool))):
+        return value
+    if isinstance(value, dict):
+        return {key: shape(item, keep, key) for key, item in value.items()}
+    if isinstance(value, list):
+        # Items of one request are alike (bulk bodies): keep the first one's shape and the count
+        return {"$list": shape(value[0], keep, name) if value else None, "len": len(value)}
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return _string_kind(str(value))
+
+
+def _query_shape(querydict, keep):
+    return {key: shape(querydict.get(key), keep, key) for key in querydict}
+
+
+def synthesize(value, n):
+    """A stand-in payload for a recorded shape; n (the request number) keeps generated values apart."""
+    if isinstance(value, dict):
+        if "$list" in value:
+            return [synthesize(value["$list"], n * 1000 + i) for i in range(value["len"])]
+        return {key: synthesize(item, n) for key, item in value.items()}
+    if not isinstance(value, str) or ":" not in value and value not in ("email", "date", "time", "int", "float"):
+        return value  # kept as captured
+    kind, _, size = value.partition(":")
+    if kind == "email":
+        return f"replay{n}@example.com"
+    if kind == "date":
+        return date.today().isoformat()
+    if kind == "time":
+        return "09:00"
+    if kind == "int":
+        return n % 100
+    if kind == "float":
+        return 1.0
+    if kind == "digits" and size.isdigit():
+        return str(n).zfill(int(size))[-int(size):]
+    if kind == "str" and size.isdigit():
+        return f"R{n}".ljust(int(size), "x")[:int(size)]
+    return value
+
+
+# -----------------------------
+# Writer
+# -----------------------------
+class CaptureLog:
+    def __init__(self, directory, max_bytes, backups):
+        os.makedirs(directory, exist_ok=True)
+        # pid looked up here, on the first captured request: forked workers each get their own file
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, f"capture-{os.getpid()}.jsonl"), maxBytes=max_bytes,
+            backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        self._queue.put(logging.makeLogRecord({"msg": line, "levelno": logging.INFO}))
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_capture_log():
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = CaptureLog(settings.TRAFFIC_CAPTURE_DIR, settings.TRAFFIC_CAPTURE_MAX_BYTES,
+                                  settings.TRAFFIC_CAPTURE_BACKUPS)
+    return _log
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+class TrafficCaptureMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.keep = frozenset(settings.TRAFFIC_CAPTURE_KEEP_FIELDS)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        if not request.path.startswith(settings.TRAFFIC_CAPTURE_PREFIX):
+            return self.get_response(request)
+        ts, body = time.time(), self._json_body(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, ts, body, started)
+        return response
+
+    async def _acall(self, request):
+        if not request.path.startswith(settings.TRAFFIC_CAPTURE_PREFIX):
+            return await self.get_response(request)
+        ts, body = time.time(), self._json_body(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, ts, body, started)
+        return response
+
+    def _json_body(self, request):
+        # Read before the view: once DRF has consumed the stream, request.body is gone
+        if request.content_type != "application/json":
+            return None
+        size = int(request.META.get("CONTENT_LENGTH") or 0)
+        if size > settings.TRAFFIC_CAPTURE_MAX_BODY:
+            return {"$skipped": size}
+        try:
+            return shape(json.loads(request.body or b"null"), self.keep)
+        except ValueError:
+            return {"$invalid": size}
+
+    def _record(self, request, response, ts, body, started):
+        elapsed = time.perf_counter() - started
+        try:
+            body_type = None
+            if body is not None:
+                body_type = "json"
+            elif request.content_type in ("multipart/form-data", "application/x-www-form-urlencoded"):
+                # Parsed by the view already (DRF hands its parse back to the request)
+                body_type = "multipart" if request.content_type == "multipart/form-data" else "form"
+                body = _query_shape(request.POST, self.keep)
+                for key, upload in request.FILES.items():
+                    body[key] = {"$file": upload.size, "content_type": upload.content_type}
+            match = getattr(request, "resolver_match", None)
+            get_capture_log().write({
+                "ts": round(ts, 4),
+                "method": request.method,
+                "route": match.route if match is not None else "<unmatched>",
+                "path": request.path,
+                "query": _query_shape(request.GET, self.keep),
+                "body_type": body_type,
+                "body": body,
+                "status": response.status_code,
+                "ms": round(elapsed * 1000, 2),
+            })
+        except Exception as e:
+            # Capture is best effort; it must never break the request
+            logger.error(f"Could not capture request to {request.path}: {str(e)}")
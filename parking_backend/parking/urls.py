@@ -2,24 +2,59 @@ from django.urls import path
 # Views file-la irunthu ellathayum import pannikonga
 from .views import (
     create_reservation,
+    create_reservations_bulk,
     create_monthly_pass,
+    create_monthly_passes_bulk,
     create_yearly_pass,
+    create_yearly_passes_bulk,
     cancel_reservation, 
+    gate_check,
+    pass_holder_cache_stats,
     create_employee,
     mark_as_scanned,      # Itha add panniten
+    qr_code,
+    list_reservations,
+    list_monthly_passes,
+    list_yearly_passes,
+    list_employees,
+    spot_availability,
+    spot_free_windows,
+    utilization_report,
+    allocate_spot,
+    release_spot,
     check_scan_status,     # Ithayum add panniten
     verify_face
 )
+from .async_views import verify_face_async, verify_face_queue_stats, scan_status_stream, wait_scan_status
 
 urlpatterns = [
     path("reserve/", create_reservation, name="reserve"),
+    path("reserve/bulk/", create_reservations_bulk, name="reserve-bulk"),
+    path("spots/", spot_availability, name="spot-availability"),
+    path("spots/allocate/", allocate_spot, name="allocate-spot"),
+    path("spots/release/", release_spot, name="release-spot"),
+    path("spots/<str:spot_id>/free-windows/", spot_free_windows, name="spot-free-windows"),
+    path("analytics/utilization/", utilization_report, name="utilization-report"),
     path("create_monthly_pass/", create_monthly_pass, name="monthly-pass"),
+    path("create_monthly_pass/bulk/", create_monthly_passes_bulk, name="monthly-pass-bulk"),
     path("yearly-pass/", create_yearly_pass, name="yearly-pass"),
+    path("yearly-pass/bulk/", create_yearly_passes_bulk, name="yearly-pass-bulk"),
+    path("gate/check/", gate_check, name="gate-check"),
     path("cancel-reservation/", cancel_reservation, name="cancel-reservation"),
+    path("cancel-reservation/pass-holders/stats/", pass_holder_cache_stats, name="pass-holder-cache-stats"),
+    path("qr/<str:spot_id>/", qr_code, name="qr-code"),
+    path("reservations/", list_reservations, name="list-reservations"),
+    path("monthly-passes/", list_monthly_passes, name="list-monthly-passes"),
+    path("yearly-passes/", list_yearly_passes, name="list-yearly-passes"),
+    path("employees/", list_employees, name="list-employees"),
     path("new-employee/", create_employee, name='create_employee'),
     path("verify-face/", verify_face, name='verify_face'),
+    path("verify-face-async/", verify_face_async, name='verify_face_async'),
+    path("verify-face-async/stats/", verify_face_queue_stats, name='verify_face_queue_stats'),
     
     # Prefix-a remove panniyachu, ഏன்னா main file-laye 'api/' irukku
     path('mark_as_scanned/<str:spot_id>/', mark_as_scanned, name='mark_as_scanned'),
     path('check_scan_status/<str:spot_id>/', check_scan_status, name='check_scan_status'),
+    path('scan_status_stream/<str:spot_id>/', scan_status_stream, name='scan_status_stream'),
+    path('wait_scan_status/<str:spot_id>/', wait_scan_status, name='wait_scan_status'),
 ]
\ No newline at end of file
@@ -2,143 +2,168 @@ import os
 # CRITICAL: This must be set before any other imports to prevent segmentation faults with NumPy 2.x
 os.environ["NUMPY_RELAX_UPPER_BOUND"] = "1"
 
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from django.shortcuts import get_object_or_404
-from .models import Reservation, MonthlyPass, YearlyPass, Employee
-from .serializers import ReservationSerializer, MonthlyPassSerializer, YearlyPassSerializer, EmployeeSerializer
-from .qr import generate_qr
+from django.http import HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_GET
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+from .models import Reservation, Employee, normalize_email
+from .serializers import ReservationSerializer, MonthlyPassSerializer, YearlyPassSerializer, EmployeeSerializer, reservation_created_data
+from .renderers import scan_status_response
+from . import profiling
+from .qr import qr_data_uri, qr_path, render_qr_png, scan_url
+from .bulk import bulk_create_passes, bulk_create_reservations
+from .entitlements import get_entitlement_index
+from .pass_holders import get_pass_holder_cache
+from .rollups import capacity_units, utilization
+from .listing import list_response
+from .allocator import SpotUnavailable, UnknownSpot, get_allocator, lock_spot
+from .intervals import get_interval_index, reservation_window
+from .scan_events import consume_scan, delete_reservation, mark_scanned, scan_hub
 from django.conf import settings
 import logging
 
 # Set up logging to track crashes
 logger = logging.getLogger(__name__)
 
-import subprocess
-import json
-import cv2
-import numpy as np
-
 @api_view(['POST'])
 def verify_face(request):
-    temp_path = None
-    try:
-        # 1. Get uploaded image
-        uploaded_file = request.FILES.get('image')
-        if not uploaded_file:
-            return Response({'error': 'No image provided'}, status=400)
-
-        # 2. Save uploaded image temporarily
-        temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(temp_path, 'wb+') as destination:
-            for chunk in uploaded_file.chunks():
-                destination.write(chunk)
-
-        # 3. Ensure DB path exists
-        db_path = os.path.join(settings.MEDIA_ROOT, 'employee_faces')
-        if not os.path.exists(db_path):
-             return Response({'error': 'No registered faces found in database.'}, status=404)
-
-        # 4. Attempt Face Verification using Isolated Subprocess (prevents server crash)
-        worker_script = os.path.join(os.path.dirname(__file__), 'face_worker.py')
-        python_exe = os.path.join(settings.BASE_DIR, 'venv', 'bin', 'python')
-        
-        try:
-            result = subprocess.run(
-                [python_exe, worker_script, temp_path, db_path],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                try:
-                    data = json.loads(result.stdout.strip())
-                    if data.get('success'):
-                        identity = data.get('identity')
-                        filename = os.path.basename(identity)
-                        employee = Employee.objects.filter(profile_pic__icontains=filename).first()
-                        if employee:
-                            return Response({
-                                'success': True,
-                                'employee': EmployeeSerializer(employee).data
-                            })
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to parse face_worker output: {result.stdout}")
-            elif result.returncode == -11 or result.returncode == 139:
-                logger.error("Face verification process crashed (Segmentation Fault). Falling back to OpenCV.")
-            else:
-                logger.error(f"Face verification process failed with code {result.returncode}: {result.stderr}")
-
-        except subprocess.TimeoutExpired:
-            logger.error("Face verification process timed out.")
-        except Exception as e:
-            logger.error(f"Subprocess error: {str(e)}")
-
-        # 5. Fallback to OpenCV (Feature Matching) if DeepFace fails or crashes
-        logger.info("Starting OpenCV fallback matching...")
-        try:
-            best_match = None
-            max_matches = 0
-            
-            # Load probe image
-            probe_img = cv2.imread(temp_path, cv2.IMREAD_GRAYSCALE)
-            if probe_img is not None:
-                orb = cv2.ORB_create()
-                kp1, des1 = orb.detectAndCompute(probe_img, None)
-                
-                if des1 is not None:
-                    # Iterate through all employee faces
-                    for filename in os.listdir(db_path):
-                        if filename.endswith(('.jpg', '.jpeg', '.png')) and not filename.startswith('.'):
-                            target_path = os.path.join(db_path, filename)
-                            target_img = cv2.imread(target_path, cv2.IMREAD_GRAYSCALE)
-                            
-                            if target_img is not None:
-                                kp2, des2 = orb.detectAndCompute(target_img, None)
-                                if des2 is not None:
-                                    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-                                    matches = bf.match(des1, des2)
-                                    if len(matches) > max_matches:
-                                        max_matches = len(matches)
-                                        best_match = filename
-
-            # Threshold for "match" in ORB - 80 is a conservative estimate
-            if max_matches > 80:
-                employee = Employee.objects.filter(profile_pic__icontains=best_match).first()
-                if employee:
-                    return Response({
-                        'success': True,
-                        'employee': EmployeeSerializer(employee).data,
-                        'method': 'fallback'
-                    })
-
-        except Exception as e:
-            logger.error(f"OpenCV fallback error: {str(e)}")
-
-        return Response({'error': 'Face not recognized'}, status=401)
+    uploaded_file = request.FILES.get('image')
+    if not uploaded_file:
+        return Response({'error': 'No image provided'}, status=400)
 
-    except Exception as e:
-        logger.error(f"Verify Face outer error: {str(e)}")
-        return Response({'error': str(e)}, status=500)
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except: pass
+    # Imported on first use: OpenCV / NumPy stay out of workers that never verify a face
+    from .face_match import match_face
+
+    with profiling.profiled() as profile:
+        body, status_code = match_face(uploaded_file.read(), uploaded_file.name)
+    response = Response(body, status=status_code)
+    if profile is not None and profiling.wants_server_timing(request):
+        response['Server-Timing'] = profile.server_timing()
+    return response
 
 @api_view(['POST'])
 def create_reservation(request):
     serializer = ReservationSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        branch = serializer.validated_data.get('branch', '')
+        spot_id = serializer.validated_data['spot_id']
+
+        start, end = reservation_window(timezone.localdate(), serializer.validated_data['start_time'],
+                                        serializer.validated_data['end_time'])
+        allocator = get_allocator()
+        hold = request.data.get('hold')
+        try:
+            # Spot / type / branch not in the layout: refuse before any lock row is made
+            allocator.check(branch, spot_id, serializer.validated_data['spot_type'])
+            # Spot row locked till commit: count + INSERT is one step for every server process
+            with transaction.atomic():
+                lock_spot(branch, spot_id)
+                # Room left in this time window? (bookings from the DB + other clients' holds;
+                # a hold from spots/allocate/ on this spot is the client's own)
+                allocator.claim(branch, spot_id, start, end, hold)
+                serializer.save()  # interval index + rollups are updated by parking.signals
+        except UnknownSpot as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except SpotUnavailable as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        allocator.confirm(branch, spot_id, hold)
+        return Response(reservation_created_data(serializer), status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+def create_reservations_bulk(request):
+    body, status_code = bulk_create_reservations(ReservationSerializer, request.data)
+    return Response(body, status=status_code)
+
+# -----------------------------
+# SPOT ALLOCATION
+# -----------------------------
+@api_view(['GET'])
+def spot_availability(request):
+    branch = request.query_params.get('branch', '')
+    try:
+        return Response(get_allocator().availability(branch))
+    except UnknownSpot as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+def spot_free_windows(request, spot_id):
+    branch = request.query_params.get('branch', '')
+    day = parse_date(request.query_params.get('date', '')) or timezone.localdate()
+
+    try:
+        get_allocator().check(branch, spot_id)
+    except UnknownSpot as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    start = datetime.combine(day, time.min)
+    windows = get_interval_index().free_windows(branch, spot_id, start, start + timedelta(days=1))
+    return Response({
+        "spot_id": spot_id,
+        "date": day.isoformat(),
+        "free_windows": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in windows],
+    })
+
+# -----------------------------
+# ANALYTICS (reads only the hourly rollups)
+# -----------------------------
+@api_view(['GET'])
+def utilization_report(request):
+    branch = request.query_params.get('branch', '')
+    spot_type = request.query_params.get('spot_type', 'car')
+    if spot_type not in settings.PARKING_LAYOUT:
+        return Response({"error": f"Unknown spot type {spot_type}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    date_from = parse_date(request.query_params.get('from', '')) or timezone.localdate()
+    date_to = parse_date(request.query_params.get('to', '')) or date_from
+    if date_to < date_from or (date_to - date_from).days > 92:
+        return Response({"error": "Use a from/to range of at most 92 days."}, status=status.HTTP_400_BAD_REQUEST)
+
+    start = datetime.combine(date_from, time.min)
+    end = datetime.combine(date_to, time.min) + timedelta(days=1)
+    return Response({
+        "branch": branch,
+        "spot_type": spot_type,
+        "capacity_units": capacity_units(spot_type),
+        "hours": utilization(branch, spot_type, start, end),
+    })
+
+@api_view(['POST'])
+def allocate_spot(request):
+    branch = request.data.get('branch', '')
+    spot_type = request.data.get('spot_type', 'car')
+    near = request.data.get('near')
+
+    try:
+        spot_id, hold = get_allocator().allocate(branch, spot_type, near)
+    except UnknownSpot as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except SpotUnavailable as e:
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+    return Response({
+        "spot_id": spot_id,
+        "spot_type": spot_type,
+        "hold": hold,
+        "expires_in": settings.SPOT_HOLD_SECONDS,
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+def release_spot(request):
+    hold = request.data.get('hold')
+    if not hold:
+        return Response({"error": "hold is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not get_allocator().release_hold(hold):
+        return Response({"error": "Hold not found or already expired."}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"success": "Spot released."})
+
 @api_view(['POST'])
 def create_monthly_pass(request):
     serializer = MonthlyPassSerializer(data=request.data)
@@ -155,6 +180,40 @@ def create_yearly_pass(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Fleet / corporate onboarding: a list of passes in one request
+@api_view(['POST'])
+def create_monthly_passes_bulk(request):
+    body, status_code = bulk_create_passes(MonthlyPassSerializer, request.data, "monthly")
+    return Response(body, status=status_code)
+
+@api_view(['POST'])
+def create_yearly_passes_bulk(request):
+    body, status_code = bulk_create_passes(YearlyPassSerializer, request.data, "yearly")
+    return Response(body, status=status_code)
+
+# -----------------------------
+# GATE CHECK (pass-holder vehicles)
+# -----------------------------
+@api_view(['POST'])
+def gate_check(request):
+    # One plate ({"vehicle_number": ...}) or a whole multi-lane batch ({"vehicle_numbers": [...]})
+    if 'vehicle_numbers' in request.data:
+        plates = request.data.get('vehicle_numbers')
+        if not isinstance(plates, list) or not plates:
+            return Response({"error": "vehicle_numbers must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        bad = [i for i, plate in enumerate(plates) if not isinstance(plate, str) or not plate.strip()]
+        if bad:
+            return Response({"error": "vehicle_numbers must all be non-empty strings.", "invalid_indexes": bad},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": get_entitlement_index().check(plates)})
+
+    plate = request.data.get('vehicle_number')
+    if not plate:
+        return Response({"error": "vehicle_number is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(plate, str) or not plate.strip():
+        return Response({"error": "vehicle_number must be a non-empty string."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(get_entitlement_index().check([plate])[0])
+
 # -----------------------------
 # CANCEL RESERVATION (Step 1: Generate QR)
 # -----------------------------
@@ -162,52 +221,103 @@ def create_yearly_pass(request):
 def cancel_reservation(request):
     try:
         spot_id = request.data.get('spot_id')
-        email = request.data.get('email', '').lower().strip()
+        email = normalize_email(request.data.get('email', ''))
         password = request.data.get('password', '')
 
         if not spot_id or not email or not password:
             return Response({"error": "All fields are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        res_query = Reservation.objects.filter(spot_id=spot_id, email__iexact=email)
+        # One indexed query: this spot's reservations for the (lowercase) email
+        candidates = list(
+            Reservation.objects.filter(spot_id=spot_id, email=email)
+            .order_by('pk')
+            .values('pk', 'password', 'branch')
+        )
 
-        if not res_query.exists():
+        if not candidates:
             return Response({"error": "No reservation found."}, status=status.HTTP_404_NOT_FOUND)
 
-        target_res = res_query.filter(password=password).first()
+        target_res = next((res for res in candidates if res['password'] == password), None)
         if not target_res:
             return Response({"error": "Incorrect password."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # PASS HOLDER CHECK (No QR needed for them as per your old logic)
-        is_monthly = MonthlyPass.objects.filter(email__iexact=email).exists()
-        is_yearly = YearlyPass.objects.filter(email__iexact=email).exists()
-
-        if is_yearly or is_monthly:
-            target_res.delete() # Pass holders-ku direct delete
+        # PASS HOLDER CHECK (No QR needed for them as per your old logic) - answered from the cache
+        if get_pass_holder_cache().is_pass_holder(email):
+            # Pass holders-ku direct delete
+            if not delete_reservation(target_res['pk'], target_res['branch'], spot_id):
+                return Response({"error": "No reservation found."}, status=status.HTTP_404_NOT_FOUND)
             return Response({"success": "Cancelled. Pass holder verified!", "qr": None})
 
-        # NORMAL USER: Generate QR for confirmation
-        qr_file_path = generate_qr(spot_id) # qr.py function call
-        
+        # NORMAL USER: QR for confirmation - inline data URI, or the cached QR endpoint
+        qr = qr_data_uri(spot_id) if settings.QR_INLINE_DATA_URI else qr_path(spot_id)
+
         return Response({
             "success": "Please scan the QR code to confirm cancellation.",
-            "qr": qr_file_path
+            "qr": qr
         }, status=status.HTTP_200_OK)
 
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
+@api_view(['GET'])
+def pass_holder_cache_stats(request):
+    return Response(get_pass_holder_cache().stats())
+
+# -----------------------------
+# LIST APIs (keyset pages, ?fields=, streamed) - staff only, they carry every customer's details
+# -----------------------------
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_reservations(request):
+    return list_response("reservations", request.query_params)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_monthly_passes(request):
+    return list_response("monthly_passes", request.query_params)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_yearly_passes(request):
+    return list_response("yearly_passes", request.query_params)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_employees(request):
+    return list_response("employees", request.query_params)
+
+# -----------------------------
+# METRICS (Prometheus text format, routed at /metrics)
+# -----------------------------
+@require_GET
+def metrics_view(request):
+    from . import metrics
+
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# -----------------------------
+# QR IMAGE (rendered in memory, cached per payload)
+# -----------------------------
+def qr_code(request, spot_id):
+    png, etag = render_qr_png(scan_url(spot_id))
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(png, content_type="image/png")
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={settings.QR_CACHE_MAX_AGE}"
+    return response
+
 # -----------------------------
 # SCANNER ENDPOINT (Step 2: Mobile Scanner hits this)
 # -----------------------------
 @api_view(['GET']) # POST thevaiyillai
 def mark_as_scanned(request, spot_id):
     try:
-        # Latest active reservation-ah eduthu is_scanned update panrom
-        res = Reservation.objects.filter(spot_id=spot_id, is_scanned=False).last()
-        
-        if res:
-            res.is_scanned = True
-            res.save()
+        # Latest active reservation-ah eduthu is_scanned update panrom (one UPDATE)
+        if mark_scanned(spot_id):
+            # Waiting panels (SSE / long-poll) get told straight away
+            scan_hub.publish(spot_id)
             # Mobile-la scan pannavangaluku intha message mattum theriyum
             return Response("<h1>Scan Success! Reservation marked for cancellation.</h1>")
         
@@ -220,20 +330,12 @@ def mark_as_scanned(request, spot_id):
 # views.py
 @api_view(['GET'])
 def check_scan_status(request, spot_id):
-    # active-ah irukura record, mobile-la scan aanatha mattum edukkurom
-    res = Reservation.objects.filter(spot_id=spot_id, is_scanned=True).first()
-    
-    if res:
-        # Success message-ah variable-la vechikonga
-        data = {"is_scanned": True}
-        
-        # Database-la irunthu antha record-ah delete pannidunga (Very Important)
-        res.delete()
-        
-        # Ippo Response anupunga
-        return Response(data)
-    
-    return Response({"is_scanned": False})
+    # active-ah irukura record, mobile-la scan aanatha mattum edukkurom.
+    # Found-na Database-la irunthu antha record-ah delete pannidum (Very Important)
+    is_scanned = consume_scan(spot_id)
+    if settings.FAST_SERIALIZATION:
+        return scan_status_response(is_scanned)  # pre-encoded body, no renderer round trip
+    return Response({"is_scanned": is_scanned})
 
 @api_view(['POST'])
 def create_employee(request):
@@ -250,7 +352,8 @@ def create_employee(request):
         serializer = EmployeeSerializer(data=request.data)
 
     if serializer.is_valid():
-        serializer.save()
+        serializer.save()  # face index + ORB store are refreshed in the background after the commit (parking.signals)
+
         status_code = status.HTTP_200_OK if existing_employee else status.HTTP_201_CREATED
         return Response(serializer.data, status=status_code)
     
@@ -6,6 +6,8 @@ Production-ready (Render deployment)
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'parking.metrics.MetricsMiddleware',  # outermost, so it times everything below
+    'parking.traffic.TrafficCaptureMiddleware',  # off unless TRAFFIC_CAPTURE
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -77,13 +81,58 @@ WSGI_APPLICATION = 'parking_backend.wsgi.application'
 # DATABASE
 # =====================
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# DB_PROFILE picks the database set-up:
+#   sqlite      - plain db.sqlite3, rollback journal, a new connection per request (the old default)
+#   sqlite-wal  - same file in WAL mode with the PRAGMAs below (applied by parking.db on
+#                 every new connection) and persistent connections
+#   postgres    - PostgreSQL from the POSTGRES_* variables (needs psycopg), persistent,
+#                 health-checked connections; set POSTGRES_PGBOUNCER=True when going
+#                 through pgbouncer in transaction pooling mode
+DB_PROFILE = os.environ.get("DB_PROFILE", "sqlite")
+
+# How long a worker keeps its connection (seconds) in the sqlite-wal / postgres profiles
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "600"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",     # readers and the writer stop blocking each other
+    "synchronous": "NORMAL",   # fsync at checkpoints, not every commit (safe in WAL mode)
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -int(os.environ.get("SQLITE_CACHE_KB", "20000")),     # negative = KiB
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_MB", "128")) * 1024 * 1024,
+    "temp_store": "MEMORY",
 }
 
+if DB_PROFILE == "postgres":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get("POSTGRES_DB", "parking"),
+            'USER': os.environ.get("POSTGRES_USER", "parking"),
+            'PASSWORD': os.environ.get("POSTGRES_PASSWORD", ""),
+            'HOST': os.environ.get("POSTGRES_HOST", "127.0.0.1"),
+            'PORT': os.environ.get("POSTGRES_PORT", "5432"),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # pgbouncer (transaction pooling) hands each transaction a different server
+            # connection, so the list APIs' streamed iterators cannot use server-side cursors
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get("POSTGRES_PGBOUNCER", "False") == "True",
+            'OPTIONS': {'connect_timeout': int(os.environ.get("POSTGRES_CONNECT_TIMEOUT", "5"))},
+        }
+    }
+elif DB_PROFILE in ("sqlite", "sqlite-wal"):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE if DB_PROFILE == "sqlite-wal" else 0,
+            'CONN_HEALTH_CHECKS': DB_PROFILE == "sqlite-wal",
+            # A file, not the in-memory default: threaded tests then lock the way db.sqlite3 does
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_PROFILE {DB_PROFILE!r} (use sqlite, sqlite-wal or postgres).")
+
 
 # =====================
 # PASSWORD VALIDATION
@@ -140,3 +189,198 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # =====================
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+
+# =====================
+# FACE RECOGNITION
+# =====================
+
+# Python used to run parking/face_worker.py (needs DeepFace/TensorFlow)
+FACE_WORKER_PYTHON = os.environ.get("FACE_WORKER_PYTHON", os.path.join(BASE_DIR, 'venv', 'bin', 'python'))
+
+# Number of warm face workers kept per Django process
+FACE_WORKER_POOL_SIZE = int(os.environ.get("FACE_WORKER_POOL_SIZE", "2"))
+
+# Seconds allowed per verification job / for a worker to load the model
+FACE_WORKER_TIMEOUT = int(os.environ.get("FACE_WORKER_TIMEOUT", "30"))
+FACE_WORKER_STARTUP_TIMEOUT = int(os.environ.get("FACE_WORKER_STARTUP_TIMEOUT", "120"))
+
+# After a worker fails to start, wait this long before the next spawn, doubling per
+# failure up to the max (seconds); jobs fail fast meanwhile instead of respawning
+FACE_WORKER_RESPAWN_BACKOFF = float(os.environ.get("FACE_WORKER_RESPAWN_BACKOFF", "5"))
+FACE_WORKER_RESPAWN_BACKOFF_MAX = float(os.environ.get("FACE_WORKER_RESPAWN_BACKOFF_MAX", "300"))
+
+# Async verify-face endpoint: matching threads, max requests running + queued
+# before answering 503, and the Retry-After (seconds) sent with that 503
+FACE_VERIFY_CONCURRENCY = int(os.environ.get("FACE_VERIFY_CONCURRENCY", str(FACE_WORKER_POOL_SIZE)))
+FACE_VERIFY_MAX_IN_FLIGHT = int(os.environ.get("FACE_VERIFY_MAX_IN_FLIGHT", "16"))
+FACE_VERIFY_RETRY_AFTER = int(os.environ.get("FACE_VERIFY_RETRY_AFTER", "2"))
+
+# Debug only: write each verify-face upload to media/temp instead of keeping it in memory
+FACE_DEBUG_SAVE_UPLOADS = os.environ.get("FACE_DEBUG_SAVE_UPLOADS", "False") == "True"
+
+# Precomputed employee face embeddings (rebuild with: manage.py build_face_index)
+FACE_INDEX_DIR = os.environ.get("FACE_INDEX_DIR", os.path.join(BASE_DIR, 'face_index'))
+
+# Employees missing from that index are embedded in the background (first verification on an
+# empty index, or start-up with FACE_PRELOAD_ON_START); at most one attempt per this many seconds
+FACE_INDEX_BACKFILL_RETRY_SECONDS = int(os.environ.get("FACE_INDEX_BACKFILL_RETRY_SECONDS", "300"))
+
+# Minimum cosine similarity for a match (VGG-Face cosine distance 0.68 => 0.32)
+FACE_MATCH_MIN_SIMILARITY = float(os.environ.get("FACE_MATCH_MIN_SIMILARITY", "0.32"))
+
+# Load the face stack (OpenCV / NumPy, index, face workers) when the app starts
+# instead of on the first verification. Set it only on face-serving workers,
+# and not together with gunicorn --preload (the face workers must not be forked).
+FACE_PRELOAD_ON_START = os.environ.get("FACE_PRELOAD_ON_START", "False") == "True"
+
+# Stage timings of the face pipeline (dump with: manage.py face_profile).
+# SERVER_TIMING also returns them in a Server-Timing header on every
+# verification; without it a request can ask with "X-Face-Profile: 1".
+FACE_PROFILING = os.environ.get("FACE_PROFILING", "True") == "True"
+FACE_PROFILE_SERVER_TIMING = os.environ.get("FACE_PROFILE_SERVER_TIMING", "False") == "True"
+FACE_PROFILE_DIR = os.environ.get("FACE_PROFILE_DIR", os.path.join(BASE_DIR, 'face_profile'))
+FACE_PROFILE_SAMPLES = int(os.environ.get("FACE_PROFILE_SAMPLES", "2000"))
+FACE_PROFILE_FLUSH_SECONDS = int(os.environ.get("FACE_PROFILE_FLUSH_SECONDS", "30"))
+# A process's samples file not rewritten for this long (the process exited, or
+# has stopped verifying) is deleted instead of being merged into the report
+FACE_PROFILE_MAX_AGE = int(os.environ.get("FACE_PROFILE_MAX_AGE", "86400"))
+
+
+# =====================
+# SCAN NOTIFICATIONS (SSE / long-poll)
+# =====================
+
+SCAN_STREAM_MAX_SECONDS = int(os.environ.get("SCAN_STREAM_MAX_SECONDS", "300"))
+SCAN_STREAM_HEARTBEAT_SECONDS = int(os.environ.get("SCAN_STREAM_HEARTBEAT_SECONDS", "15"))
+SCAN_LONG_POLL_SECONDS = int(os.environ.get("SCAN_LONG_POLL_SECONDS", "25"))
+
+
+# =====================
+# CANCELLATION QR
+# =====================
+
+# Public base URL the phone scanner reaches this server on
+QR_SCAN_BASE_URL = os.environ.get("QR_SCAN_BASE_URL", "http://10.154.53.42:8000")
+
+# Rendered PNGs kept in memory, and how long clients may cache them
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "256"))
+QR_CACHE_MAX_AGE = int(os.environ.get("QR_CACHE_MAX_AGE", "3600"))
+
+# Return the QR as a data URI in the cancel response (saves a request)
+QR_INLINE_DATA_URI = os.environ.get("QR_INLINE_DATA_URI", "False") == "True"
+
+
+# =====================
+# SPOT ALLOCATION
+# =====================
+
+# Spots per type (same layout for every branch); capacity = vehicles per spot
+PARKING_LAYOUT = {
+    "car": {"spots": [str(i) for i in range(1, 9)], "capacity": 1},
+    "bike": {"spots": [str(i) for i in range(9, 13)], "capacity": 4},
+}
+
+# Branches the allocator serves ("" = bookings that name no branch, as the
+# kiosk sends them); ;-separated because branch names contain commas
+PARKING_BRANCHES = os.environ.get(
+    "PARKING_BRANCHES",
+    ";VDart Gcc, Trichy;VDart Digital, Bangalore;VDart Digital, Chennai;VDart, US Atlanta",
+).split(";")
+
+# How long a spot handed out by spots/allocate/ stays held without a reservation
+SPOT_HOLD_SECONDS = int(os.environ.get("SPOT_HOLD_SECONDS", "300"))
+
+# Booking windows cached per spot for free-windows/ are read again after this many
+# seconds, so bookings made by other server processes show up
+INTERVAL_INDEX_MAX_AGE = int(os.environ.get("INTERVAL_INDEX_MAX_AGE", "30"))
+
+
+# =====================
+# BULK ENDPOINTS
+# =====================
+
+# Most items accepted by one reserve/bulk/ or pass bulk request
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "500"))
+
+
+# =====================
+# GATE CHECKS
+# =====================
+
+# Full reload of the vehicle entitlement index (picks up other processes' pass changes)
+ENTITLEMENT_RECONCILE_SECONDS = int(os.environ.get("ENTITLEMENT_RECONCILE_SECONDS", "300"))
+
+
+# =====================
+# PASS HOLDER CACHE
+# =====================
+
+# Reload interval for the per-process pass-holder email map (and lifetime of the shared copy)
+PASS_HOLDER_CACHE_TTL = int(os.environ.get("PASS_HOLDER_CACHE_TTL", "300"))
+
+# Optional CACHES alias shared by the workers; empty keeps the map per process
+PASS_HOLDER_CACHE_ALIAS = os.environ.get("PASS_HOLDER_CACHE_ALIAS", "")
+
+
+# =====================
+# RESERVATION SWEEPER
+# =====================
+
+# Rows read (and at most moved) per sweep_reservations transaction
+RESERVATION_SWEEP_BATCH_SIZE = int(os.environ.get("RESERVATION_SWEEP_BATCH_SIZE", "500"))
+
+
+# =====================
+# LIST APIs
+# =====================
+
+# Rows per page when ?limit= is not given, and the largest ?limit= accepted (exports)
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", "100"))
+LIST_MAX_PAGE_SIZE = int(os.environ.get("LIST_MAX_PAGE_SIZE", "10000"))
+
+
+# =====================
+# SERIALIZATION
+# =====================
+
+# Fast JSON renderer (orjson when installed) + lean serializers for the hot
+# responses (face match, scan status, reservation create). False restores
+# DRF's JSONRenderer and the full ModelSerializer payloads.
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "True") == "True"
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "parking.renderers.FastJSONRenderer" if FAST_SERIALIZATION else "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+
+# =====================
+# METRICS
+# =====================
+
+# Per-route latency / size histograms, DB query counts and face counters at /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True") == "True"
+
+
+# =====================
+# TRAFFIC CAPTURE (for replay_traffic)
+# =====================
+
+# Record the shape of every API request (no personal values) to rotating JSONL files
+TRAFFIC_CAPTURE = os.environ.get("TRAFFIC_CAPTURE", "False") == "True"
+TRAFFIC_CAPTURE_DIR = os.environ.get("TRAFFIC_CAPTURE_DIR", os.path.join(BASE_DIR, 'traffic'))
+TRAFFIC_CAPTURE_PREFIX = "/api/"
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.environ.get("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRAFFIC_CAPTURE_BACKUPS = int(os.environ.get("TRAFFIC_CAPTURE_BACKUPS", "5"))
+
+# JSON bodies larger than this are recorded as skipped
+TRAFFIC_CAPTURE_MAX_BODY = int(os.environ.get("TRAFFIC_CAPTURE_MAX_BODY", str(1024 * 1024)))
+
+# Fields whose values are kept as sent; every other value is reduced to its kind
+TRAFFIC_CAPTURE_KEEP_FIELDS = [
+    "branch", "spot_id", "spot_type", "near", "start_time", "end_time", "duration_hours",
+    "start_date", "end_date", "date", "from", "to", "limit", "fields",
+]
@@ -20,6 +20,7 @@ from django.urls import path, include
 from django.http import HttpResponse
 from django.conf import settings
 from django.conf.urls.static import static
+from parking.views import metrics_view
 
 def home(request):
     return HttpResponse("Parking Backend API is running")
@@ -27,6 +28,7 @@ def home(request):
 urlpatterns = [
     path("", home),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),  # Prometheus scrape target
     path("api/", include("parking.urls")),  # your app urls
 ]
 